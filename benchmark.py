@@ -0,0 +1,215 @@
+"""
+Нагрузочный тест ETL-процесса на синтетических данных
+
+Использование:
+    python benchmark.py --from 01032021 --days 3 --rows 1000000
+        [--cards 100000] [--planted 10] [--config config.json]
+        [--workdir bench] [--seed 42] [--replay]
+
+Запускать только на отдельной (тестовой) базе данных: в справочники
+cards/accounts/clients загружаются синтетические клиенты с префиксом
+BENCH-, в фактовые таблицы и витрину пишутся синтетические данные.
+
+С --replay данные не генерируются: дни предыдущего прогона читаются
+из архива workdir/archive по его индексу, ожидаемые события - из
+workdir/expected.
+"""
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+from main import setup_logging, get_option
+from py_scripts.data_generator import SyntheticDataset, CLIENT_PREFIX
+from py_scripts.db_utils import copy_to_table, raw_connection
+from py_scripts.etl_pipeline import ETLPipeline
+from py_scripts.file_utils import normalize_date
+from py_scripts.load_config import load_config
+
+
+def write_bench_config(config_path, workdir):
+    """Конфигурация с каталогами файлов и архива внутри workdir"""
+    config = load_config(config_path)
+    config['paths']['files_dir'] = os.path.join(workdir, 'files')
+    config['paths']['archive_dir'] = os.path.join(workdir, 'archive')
+    config.setdefault('metrics', {})['dir'] = os.path.join(workdir, 'metrics')
+
+    bench_config_path = os.path.join(workdir, 'bench_config.json')
+    os.makedirs(workdir, exist_ok=True)
+    with open(bench_config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    return bench_config_path
+
+
+def load_reference(engine, reference):
+    """Замена синтетических клиентов, счетов и карт в справочниках БД"""
+    with raw_connection(engine) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM bank.cards WHERE account IN ("
+            "SELECT account FROM bank.accounts WHERE client LIKE %s)",
+            (f'{CLIENT_PREFIX}%',)
+        )
+        cursor.execute(
+            "DELETE FROM bank.accounts WHERE client LIKE %s",
+            (f'{CLIENT_PREFIX}%',)
+        )
+        cursor.execute(
+            "DELETE FROM bank.clients WHERE client_id LIKE %s",
+            (f'{CLIENT_PREFIX}%',)
+        )
+        for table in ('clients', 'accounts', 'cards'):
+            buffer = io.StringIO()
+            reference[table].to_csv(buffer, sep=';', header=False, index=False)
+            buffer.seek(0)
+            copy_to_table(
+                conn, f'bank.{table}', buffer,
+                list(reference[table].columns)
+            )
+
+
+def stage_metrics(etl, date_str):
+    """Метрики этапов текущего запуска за дату из bank.meta_stage_metrics"""
+    load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+    query = text(
+        """
+        SELECT stage_name, status, duration_sec, rows_processed,
+               rows_per_sec, process_peak_rss_mb
+        FROM bank.meta_stage_metrics
+        WHERE run_id = :run_id AND load_date = :load_date
+          AND statement_index IS NULL
+        ORDER BY metric_id
+        """
+    )
+    with etl.engine.connect() as conn:
+        return pd.read_sql(
+            query, conn,
+            params={'run_id': etl.metrics.run_id, 'load_date': load_date}
+        )
+
+
+def read_expected(workdir, dates):
+    """Ожидаемые события предыдущего прогона по датам"""
+    expected_by_date = {}
+    for date_str in dates:
+        path = os.path.join(
+            workdir, 'expected', f'expected_fraud_{date_str}.csv'
+        )
+        expected_by_date[date_str] = pd.read_csv(path, sep=';', dtype=str)
+    return expected_by_date
+
+
+def verify_planted(etl, expected):
+    """Доля внедренных событий, найденных в bank.rep_fraud"""
+    if expected.empty:
+        return 1.0, expected
+
+    query = text(
+        """
+        SELECT event_dt, passport, event_type
+        FROM bank.rep_fraud
+        WHERE passport = ANY(:passports)
+        """
+    )
+    with etl.engine.connect() as conn:
+        found = pd.read_sql(
+            query, conn,
+            params={'passports': list(expected['passport'].unique())}
+        )
+
+    expected = expected.assign(event_dt=pd.to_datetime(expected['event_dt']))
+    found['event_dt'] = pd.to_datetime(found['event_dt'])
+    merged = expected.merge(
+        found, on=['event_dt', 'passport', 'event_type'],
+        how='left', indicator=True
+    )
+    missing = merged[merged['_merge'] == 'left_only'].drop(columns='_merge')
+    return 1 - len(missing) / len(expected), missing
+
+
+def main():
+    """Генерация данных, прогон ETL по дням и проверка результатов"""
+    start_date = normalize_date(get_option('--from') or '01032021')
+    days = int(get_option('--days') or 1)
+    rows = int(get_option('--rows') or 100000)
+    cards = int(get_option('--cards') or 100000)
+    planted = int(get_option('--planted') or 10)
+    seed = int(get_option('--seed') or 42)
+    workdir = get_option('--workdir') or 'bench'
+    config_path = get_option('--config') or 'config.json'
+    replay = '--replay' in sys.argv
+
+    setup_logging()
+    bench_config_path = write_bench_config(config_path, workdir)
+
+    dataset = SyntheticDataset(
+        start_date, days, rows, n_cards=cards,
+        planted_per_day=planted, seed=seed
+    )
+    etl = ETLPipeline(bench_config_path)
+    if replay:
+        dates = [d for d in dataset.dates if d in etl.archive.dates()]
+        if not dates:
+            print(f"В архиве {etl.archive.archive_dir} нет дней прогона")
+            sys.exit(1)
+        print(f"Повторная загрузка из архива: {len(dates)} дн.")
+        expected_by_date = read_expected(workdir, dates)
+    else:
+        print(f"Генерация данных: {days} дн. x {rows} транзакций, "
+              f"{cards} карт")
+        started = time.perf_counter()
+        expected_by_date = dataset.write_files(
+            os.path.join(workdir, 'files'), os.path.join(workdir, 'expected')
+        )
+        print(f"Данные сгенерированы за {time.perf_counter() - started:.1f} с")
+        dates = dataset.dates
+
+    with raw_connection(etl.engine) as conn:
+        etl.db_manager.ensure_database_ready(conn)
+    load_reference(etl.engine, dataset.reference_data())
+
+    history_path = os.path.join(workdir, 'bench_history.jsonl')
+    failed = False
+    for date_str in dates:
+        started = time.perf_counter()
+        etl.process_date(date_str, replay=replay)
+        total = time.perf_counter() - started
+
+        metrics = stage_metrics(etl, date_str)
+        recall, missing = verify_planted(etl, expected_by_date[date_str])
+
+        print("-" * 60)
+        print(f"Дата {date_str}: {total:.1f} с, "
+              f"{rows / total:.0f} транзакций/с")
+        print(metrics.to_string(index=False))
+        print(f"Найдено внедренных событий: {recall:.0%}")
+        if not missing.empty:
+            failed = True
+            print("Не найдены:")
+            print(missing.to_string(index=False))
+
+        with open(history_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'run_at': datetime.now().isoformat(timespec='seconds'),
+                'run_id': etl.metrics.run_id,
+                'date': date_str,
+                'rows': rows,
+                'cards': cards,
+                'replay': replay,
+                'total_sec': total,
+                'recall': recall,
+                'stages': metrics.to_dict(orient='records'),
+            }, default=str, ensure_ascii=False) + '\n')
+
+    print("-" * 60)
+    print(f"История запусков: {history_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Расчет витрины мошенничества по файлам без загрузки в БД
+
+Использование:
+    python fraud_offline.py --from 01032021 --to 31032021
+        [--files-dir files] [--reference sql_scripts/ddl_dml.sql]
+        [--output report.csv] [--parity] [--config config.json]
+        [--shards N]
+
+Файлы берутся из --files-dir; если в нем есть индекс архива
+(manifest.jsonl), дни читаются из архива поблочно. Справочники
+cards/accounts/clients - из SQL-скрипта с INSERT-ами. Правила вычисляются
+в памяти процесса (py_scripts/fraud_engine.py) день за днем, как в ETL;
+с --shards N - по сегментам карт в N рабочих процессах.
+С --parity результат сравнивается с bank.rep_fraud за тот же период.
+"""
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+from main import setup_logging, get_option
+from py_scripts import fraud_engine
+from py_scripts.archive import Archive, MANIFEST_NAME
+from py_scripts.data_quality import (
+    check_transactions, check_blacklist, check_terminals
+)
+from py_scripts.dimensions import DIMENSIONS
+from py_scripts.etl_pipeline import ETLPipeline
+from py_scripts.file_utils import (
+    iter_file_chunks, load_file_to_df, validate_columns, normalize_date,
+    date_range, TRANSACTIONS_COLUMNS
+)
+from py_scripts.fraud_rules import FRAUD_RULES
+
+
+INSERT_PATTERN = re.compile(
+    r"insert\s+into\s+(\w+)\s*\(([^)]*)\)\s*values\s*\((.*?)\)\s*;",
+    re.IGNORECASE | re.DOTALL
+)
+VALUE_PATTERN = re.compile(r"'((?:[^']|'')*)'|(null)|([-\d.]+)", re.IGNORECASE)
+
+FILE_NAMES = {
+    'transactions': 'transactions_{date}.txt',
+    'blacklist': 'passport_blacklist_{date}.xlsx',
+    'terminals': 'terminals_{date}.xlsx',
+}
+# Тип файла -> тип в индексе архива (как в meta_load_info)
+ARCHIVE_TYPES = {
+    'transactions': 'transactions',
+    'blacklist': 'passport_blacklist',
+    'terminals': 'terminals',
+}
+
+
+def read_reference(path):
+    """Справочники из SQL-скрипта: имя таблицы -> DataFrame"""
+    with open(path, 'r', encoding='utf-8') as f:
+        script = f.read()
+
+    rows = {}
+    for table, columns, values in INSERT_PATTERN.findall(script):
+        parsed = [
+            quoted.replace("''", "'") if quoted or not (null or number)
+            else (None if null else number)
+            for quoted, null, number in VALUE_PATTERN.findall(values)
+        ]
+        columns = [c.strip() for c in columns.split(',')]
+        rows.setdefault(table.lower(), []).append(dict(zip(columns, parsed)))
+
+    return {table: pd.DataFrame(records) for table, records in rows.items()}
+
+
+def find_file(files_dir, file_type, date_str):
+    """
+    Файл за дату: путь к исходному файлу или запись индекса архива
+
+    Индекс архива используется, если исходного файла в каталоге нет
+    """
+    path = os.path.join(
+        files_dir, FILE_NAMES[file_type].format(date=date_str)
+    )
+    if os.path.exists(path):
+        return path
+    if os.path.exists(os.path.join(files_dir, MANIFEST_NAME)):
+        return Archive(files_dir).files_by_date(date_str).get(
+            ARCHIVE_TYPES[file_type]
+        )
+    return None
+
+
+def read_xlsx(source, files_dir):
+    """xlsx-файл по пути или из архива"""
+    if isinstance(source, dict):
+        return Archive(files_dir).read_excel(source)
+    return load_file_to_df(source, 'xlsx')
+
+
+def read_transactions(source, load_date, terminals=None, files_dir=None):
+    """
+    Разбор файла транзакций по чанкам с проверкой качества, как в ETL
+
+    source - путь к файлу или запись индекса архива в files_dir.
+    Возвращает (чистые транзакции, число отклоненных строк)
+    """
+    if isinstance(source, dict):
+        path = source['file_name']
+        reader = Archive(files_dir).iter_text_chunks(source)
+    else:
+        path = source
+        reader = iter_file_chunks(source, 100000)
+    chunks = []
+    rejected = 0
+    for chunk in reader:
+        clean, bad = check_transactions(
+            validate_columns(chunk, TRANSACTIONS_COLUMNS, path),
+            load_date, terminals
+        )
+        chunks.append(clean)
+        rejected += len(bad)
+    return pd.concat(chunks, ignore_index=True), rejected
+
+
+def run(start_date, end_date, files_dir, reference, shards=1):
+    """Расчет витрины по дням периода; возвращает события без дублей"""
+    enrichment = fraud_engine.build_enrichment(
+        reference['cards'], reference['accounts'], reference['clients']
+    )
+    depth = max(rule.lookback for rule in FRAUD_RULES)
+    minutes = max(rule.lookback_minutes for rule in FRAUD_RULES)
+    terminals_dim = DIMENSIONS[0]
+
+    terminals = None
+    blacklist = pd.DataFrame(columns=['passport', 'date'])
+    facts = None
+    events = []
+
+    for date_str in date_range(start_date, end_date):
+        transactions_path = find_file(files_dir, 'transactions', date_str)
+        if transactions_path is None:
+            continue
+        load_date = pd.Timestamp(
+            f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        )
+        started = time.perf_counter()
+
+        terminals_path = find_file(files_dir, 'terminals', date_str)
+        if terminals_path:
+            snapshot, _ = check_terminals(read_xlsx(terminals_path, files_dir))
+            terminals = fraud_engine.apply_snapshot(
+                terminals, snapshot, load_date, terminals_dim
+            )
+        blacklist_path = find_file(files_dir, 'blacklist', date_str)
+        if blacklist_path:
+            blacklist = pd.concat([
+                blacklist,
+                check_blacklist(read_xlsx(blacklist_path, files_dir))[0]
+            ], ignore_index=True)
+
+        new, rejected = read_transactions(
+            transactions_path, load_date,
+            None if terminals is None
+            else pd.Index(terminals['terminal_id']).unique(),
+            files_dir
+        )
+        history = fraud_engine.select_history(facts, new, depth, minutes)
+        day_events = fraud_engine.evaluate_sharded(
+            new, history, terminals,
+            enrichment, fraud_engine.blacklist_entries(blacklist), shards
+        )
+        events.append(day_events)
+
+        # Для следующего дня нужен только хвост истории карт
+        facts = pd.concat([facts, new], ignore_index=True)
+        facts = pd.concat([
+            facts.sort_values('transaction_date', kind='stable')
+            .groupby('card_num').tail(depth),
+            facts[facts['transaction_date']
+                  >= facts['transaction_date'].max()
+                  - pd.Timedelta(minutes=minutes)],
+        ]).drop_duplicates(['transaction_id', 'transaction_date'])
+
+        print(f"{date_str}: {len(new)} транзакций "
+              f"(отклонено {rejected}), {len(day_events)} событий за "
+              f"{time.perf_counter() - started:.1f} с")
+
+    if not events:
+        return pd.DataFrame(columns=fraud_engine.EVENT_COLUMNS)
+    # Как ON CONFLICT DO NOTHING: первое событие с ключом витрины
+    return pd.concat(events, ignore_index=True).drop_duplicates(
+        fraud_engine.EVENT_KEY
+    ).reset_index(drop=True)
+
+
+def main():
+    """Расчет витрины по файлам и, при --parity, сверка с БД"""
+    start_date = normalize_date(get_option('--from') or '01032021')
+    end_date = normalize_date(get_option('--to') or start_date)
+    files_dir = get_option('--files-dir') or 'files'
+    reference_path = get_option('--reference') or 'sql_scripts/ddl_dml.sql'
+    output = get_option('--output')
+    config_path = get_option('--config') or 'config.json'
+    shards = int(get_option('--shards') or 1)
+
+    setup_logging()
+    events = run(
+        start_date, end_date, files_dir, read_reference(reference_path),
+        shards
+    )
+    print("-" * 60)
+    print(events.groupby('event_type').size().to_string()
+          if not events.empty else "Случаев мошенничества не найдено")
+
+    if output:
+        events.to_csv(output, sep=';', index=False)
+        print(f"Отчет сохранен: {output}")
+
+    if '--parity' in sys.argv:
+        etl = ETLPipeline(config_path)
+        expected = etl.get_fraud_report(start_date, end_date)
+        missing, extra = fraud_engine.compare_reports(expected, events)
+        print("-" * 60)
+        print(f"SQL: {len(expected)} событий, в памяти: {len(events)}")
+        if missing.empty and extra.empty:
+            print("Результаты совпадают")
+        else:
+            print(f"Нет в расчете в памяти: {len(missing)}")
+            print(missing.head(20).to_string(index=False))
+            print(f"Нет в bank.rep_fraud: {len(extra)}")
+            print(extra.head(20).to_string(index=False))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from datetime import datetime
 try:
     from py_scripts.etl_pipeline import ETLPipeline
     from py_scripts.file_utils import normalize_date
+    from py_scripts.watch_service import WatchService
 except ImportError as e:
     print(f"Ошибка импорта модулей: {e}")
     print("Убедитесь, что все файлы находятся в правильных директориях")
@@ -34,32 +35,96 @@ def setup_logging():
     return log_file
 
 
-def validate_arguments():
-    """Валидация аргументов командной строки"""
-    if len(sys.argv) < 2:
-        print("Ошибка: Не указана дата")
-        print("Использование: python main.py ДАТА [--config config.json]")
-        print("Поддерживаемые форматы даты:")
-        print("  - DDMMYYYY (например: 01032021)")
-        print("  - DD-MM-YYYY (например: 01-03-2021)")
-        print("  - DD.MM.YYYY (например: 01.03.2021)")
-        print("  - DD/MM/YYYY (например: 01/03/2021)")
-        sys.exit(1)
-    
-    date_str = sys.argv[1]
-    
-    # Нормализация даты в формат DDMMYYYY
+def print_usage():
+    """Вывод справки по запуску"""
+    print("Использование: python main.py ДАТА [--config config.json]")
+    print("               python main.py --from ДАТА --to ДАТА "
+          "[--workers N] [--config config.json]")
+    print("               python main.py --watch [--config config.json]")
+    print("Выгрузка отчета за обработанные даты: --export report.csv "
+          "(или .parquet)")
+    print("Продолжение прерванной загрузки с незавершенного этапа: --resume")
+    print("Повторная загрузка файлов из архива: --replay")
+    print("Поддерживаемые форматы даты:")
+    print("  - DDMMYYYY (например: 01032021)")
+    print("  - DD-MM-YYYY (например: 01-03-2021)")
+    print("  - DD.MM.YYYY (например: 01.03.2021)")
+    print("  - DD/MM/YYYY (например: 01/03/2021)")
+
+
+def get_option(name):
+    """Значение именованного аргумента командной строки"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return None
+
+
+def parse_date(date_str):
+    """Нормализация даты в формат DDMMYYYY"""
     try:
         normalized_date = normalize_date(date_str)
         print(f"Дата '{date_str}' преобразована в формат: {normalized_date}")
         return normalized_date
     except ValueError as e:
         print(f"Ошибка в формате даты: {e}")
-        print("Поддерживаемые форматы:")
-        print("  - DDMMYYYY (например: 01032021)")
-        print("  - DD-MM-YYYY (например: 01-03-2021)")
-        print("  - DD.MM.YYYY (например: 01.03.2021)")
-        print("  - DD/MM/YYYY (например: 01/03/2021)")
+        print_usage()
+        sys.exit(1)
+
+
+def validate_arguments():
+    """
+    Валидация аргументов командной строки
+
+    Возвращает кортеж (начальная дата, конечная дата); для одной даты
+    обе даты совпадают
+    """
+    if "--from" in sys.argv or "--to" in sys.argv:
+        start_date = get_option("--from")
+        end_date = get_option("--to")
+        if not start_date or not end_date:
+            print("Ошибка: Для backfill нужно указать --from и --to")
+            print_usage()
+            sys.exit(1)
+        return parse_date(start_date), parse_date(end_date)
+
+    if len(sys.argv) < 2 or sys.argv[1].startswith("--"):
+        print("Ошибка: Не указана дата")
+        print_usage()
+        sys.exit(1)
+
+    date_str = parse_date(sys.argv[1])
+    return date_str, date_str
+
+
+def print_fraud_report(fraud_types):
+    """Вывод сводки отчета по мошенничеству (число событий по типам)"""
+    if not fraud_types.empty:
+        print(f"Найдено {fraud_types.sum()} случаев мошенничества:")
+        print("-" * 60)
+
+        for fraud_type, count in fraud_types.items():
+            print(f"{fraud_type}: {count}")
+    else:
+        print("Случаев мошенничества не найдено")
+
+
+def run_watch(config_path):
+    """Резидентный режим: загрузка файлов по мере поступления"""
+    if not os.path.exists(config_path):
+        print(f"Ошибка: Конфигурационный файл не найден: {config_path}")
+        sys.exit(1)
+
+    etl = ETLPipeline(config_path)
+    print(f"Режим наблюдения за каталогом: {etl.config['paths']['files_dir']}")
+    print("Остановка: Ctrl+C")
+    print("-" * 60)
+    try:
+        WatchService(etl).run()
+    except Exception as e:
+        print(f"Критическая ошибка: {e}")
+        logging.error(f"Критическая ошибка: {e}")
         sys.exit(1)
 
 
@@ -72,18 +137,26 @@ def main():
     # Настройка логирования
     log_file = setup_logging()
     print(f"Лог-файл: {log_file}")
+
+    if "--watch" in sys.argv:
+        run_watch(get_option("--config") or "config.json")
+        return
     
     # Валидация и нормализация аргументов
-    date_str = validate_arguments()
+    start_date, end_date = validate_arguments()
+    is_backfill = start_date != end_date
 
     # Определение конфигурационного файла
-    config_path = "config.json"
-    if "--config" in sys.argv:
-        config_index = sys.argv.index("--config")
-        if config_index + 1 < len(sys.argv):
-            config_path = sys.argv[config_index + 1]
+    config_path = get_option("--config") or "config.json"
+    workers = get_option("--workers")
+    export_path = get_option("--export")
+    resume = "--resume" in sys.argv
+    replay = "--replay" in sys.argv
 
-    print(f"Дата обработки: {date_str}")
+    if is_backfill:
+        print(f"Период обработки: {start_date} - {end_date}")
+    else:
+        print(f"Дата обработки: {start_date}")
     print(f"Конфигурационный файл: {config_path}")
     print("-" * 60)
 
@@ -96,43 +169,40 @@ def main():
             sys.exit(1)
         
         # Создание и запуск ETL-процесса
-        logging.info(
-            f"Запуск ETL-процесса для даты: {date_str}"
-        )
         etl = ETLPipeline(config_path)
-        
+
         # Обработка данных
-        etl.process_date(date_str)
-        
+        if is_backfill:
+            logging.info(
+                f"Запуск backfill за период: {start_date} - {end_date}"
+            )
+            dates = etl.process_range(
+                start_date, end_date,
+                workers=int(workers) if workers else None,
+                resume=resume, replay=replay
+            )
+        else:
+            logging.info(
+                f"Запуск ETL-процесса для даты: {start_date}"
+            )
+            etl.process_date(start_date, resume=resume, replay=replay)
+            dates = [start_date]
         
         # Получение и вывод отчета по мошенничеству
         print("\n" + "=" * 60)
         print("ОТЧЕТ ПО МОШЕННИЧЕСТВУ")
         print("=" * 60)
-        
-        fraud_report = etl.get_fraud_report(date_str)
-        
-        if not fraud_report.empty:
-            print(f"Найдено {len(fraud_report)} случаев мошенничества:")
-            print("-" * 60)
-            
-            # Группировка по типам мошенничества
-            fraud_types = fraud_report.groupby('event_type').size()
-            for fraud_type, count in fraud_types.items():
-                print(f"{fraud_type}: {count}")
-            
-            # print("\nПодробная информация:")
-            # print("-" * 60)
-            
-            # Вывод детальной информации
-            # for _, row in fraud_report.iterrows():
-            #     print(f"Время: {row['event_dt']}")
-            #     print(f"Паспорт: {row['passport']}")
-            #     print(f"ФИО: {row['fio']}")
-            #     print(f"Тип: {row['event_type']}")
-            #     print("-" * 30)
-        else:
-            print("Случаев мошенничества не найдено")
+
+        for date_str in dates:
+            if is_backfill:
+                print(f"\nДата: {date_str}")
+            print_fraud_report(etl.get_fraud_summary(date_str))
+
+        if export_path:
+            rows = etl.export_fraud_report(
+                export_path, date_from=dates[0], date_to=dates[-1]
+            )
+            print(f"\nОтчет выгружен в {export_path}: {rows} строк")
         
         print("\n" + "=" * 60)
         print("ОБРАБОТКА ЗАВЕРШЕНА УСПЕШНО")
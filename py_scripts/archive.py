@@ -0,0 +1,273 @@
+"""
+Сжатый архив обработанных файлов с индексом (manifest.jsonl)
+
+Файл архивируется потоково блоками: текстовый - по block_rows строк,
+остальные - по BINARY_BLOCK_SIZE байт. Каждый блок сжимается отдельным
+кадром gzip (или zstd) и дописывается в <имя файла>.<расширение сжатия>;
+последовательность кадров остается обычным файлом .gz/.zst. В индексе
+для каждого файла хранятся дата, тип, хэш содержимого, число строк
+и смещения блоков, поэтому при повторной загрузке (replay) блоки
+читаются и распаковываются по одному, без распаковки всего архива.
+"""
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:  # доступно только сжатие gzip
+    zstandard = None
+
+
+MANIFEST_NAME = 'manifest.jsonl'
+BINARY_BLOCK_SIZE = 8 * 1024 * 1024
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class ArchiveError(Exception):
+    """Ошибка записи или чтения архива"""
+
+
+def _excel_rows(path):
+    """Число строк данных xlsx-файла (без заголовка) или None"""
+    if not path.endswith('.xlsx'):
+        return None
+    from openpyxl import load_workbook  # зависимость pandas.read_excel
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.max_row
+        if rows is None:
+            rows = sum(1 for _ in sheet.iter_rows())
+        return max(rows - 1, 0)
+    finally:
+        workbook.close()
+
+
+class Archive:
+    """Архив файлов в каталоге archive_dir и его индекс"""
+
+    def __init__(self, archive_dir, compression='gzip', level=6,
+                 block_rows=100000):
+        if compression not in EXTENSIONS:
+            raise ArchiveError(f"Неизвестный формат сжатия: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            logging.getLogger(__name__).warning(
+                "zstandard не установлен, архив сжимается gzip"
+            )
+            compression = 'gzip'
+        self.archive_dir = archive_dir
+        self.compression = compression
+        self.level = level
+        self.block_rows = block_rows
+        self.manifest_path = os.path.join(archive_dir, MANIFEST_NAME)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def store(self, src_path, date_str, file_type, content_hash=None):
+        """
+        Архивирование файла с записью в индекс; исходный файл удаляется
+
+        Файл с тем же именем и содержимым повторно не сохраняется;
+        отличающийся сохраняется с отметкой времени в имени.
+        Возвращает запись индекса
+        """
+        if not os.path.exists(src_path):
+            raise FileNotFoundError(
+                f"Файл для архивирования не найден: {src_path}"
+            )
+        os.makedirs(self.archive_dir, exist_ok=True)
+        file_name = os.path.basename(src_path)
+
+        if content_hash is not None:
+            stored = self._find_content(file_name, content_hash)
+            if stored is not None:
+                os.remove(src_path)
+                return stored
+
+        extension = EXTENSIONS[self.compression]
+        archive_name = f"{file_name}{extension}"
+        if os.path.exists(os.path.join(self.archive_dir, archive_name)):
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            archive_name = f"{file_name}.{stamp}{extension}"
+
+        stat = os.stat(src_path)
+        entry = {
+            'date': date_str,
+            'file_type': file_type,
+            'file_name': file_name,
+            'archive_name': archive_name,
+            'compression': self.compression,
+            'file_size': stat.st_size,
+            'file_mtime': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            'archived_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+        archive_path = os.path.join(self.archive_dir, archive_name)
+        tmp_path = f"{archive_path}.tmp"
+        digest = hashlib.sha256()
+        with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            if file_name.endswith('.txt'):
+                header = src.readline()
+                entry['header'] = header.decode('utf-8')
+                blocks = self._text_blocks(src, digest, header)
+            else:
+                blocks = self._binary_blocks(src, digest)
+            entry['blocks'] = self._write_blocks(blocks, dst)
+
+        entry['content_hash'] = digest.hexdigest()
+        entry['rows'] = (
+            sum(block['rows'] for block in entry['blocks'])
+            if 'header' in entry else _excel_rows(src_path)
+        )
+        entry['archive_size'] = os.path.getsize(tmp_path)
+
+        # Дубликат, определенный по хэшу после чтения
+        if content_hash is None:
+            stored = self._find_content(file_name, entry['content_hash'])
+            if stored is not None:
+                os.remove(tmp_path)
+                os.remove(src_path)
+                return stored
+
+        os.replace(tmp_path, archive_path)
+        self._append(entry)
+        os.remove(src_path)
+        return entry
+
+    def _text_blocks(self, src, digest, header):
+        """
+        Блоки по block_rows строк: (байты, число строк)
+
+        Заголовок входит в первый блок, чтобы архив распаковывался
+        в исходный файл; к остальным блокам он добавляется при чтении
+        """
+        prefix = header
+        while True:
+            lines = list(itertools.islice(src, self.block_rows))
+            if not lines and prefix is None:
+                return
+            data = (prefix or b'') + b''.join(lines)
+            prefix = None
+            digest.update(data)
+            yield data, len(lines)
+            if not lines:
+                return
+
+    def _binary_blocks(self, src, digest):
+        """Блоки по BINARY_BLOCK_SIZE байт (строки не считаются)"""
+        for data in iter(lambda: src.read(BINARY_BLOCK_SIZE), b''):
+            digest.update(data)
+            yield data, 0
+
+    def _write_blocks(self, blocks, dst):
+        """Сжатие блоков отдельными кадрами; возвращает их смещения"""
+        written = []
+        first_row = 0
+        for data, rows in blocks:
+            frame = self._compress(data)
+            written.append({
+                'offset': dst.tell(),
+                'length': len(frame),
+                'first_row': first_row,
+                'rows': rows,
+            })
+            dst.write(frame)
+            first_row += rows
+        return written
+
+    def _compress(self, data):
+        """Сжатие блока в самостоятельный кадр"""
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def _append(self, entry):
+        """Дописывание записи в индекс одной операцией записи"""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def entries(self):
+        """Все записи индекса в порядке архивирования"""
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _find_content(self, file_name, content_hash):
+        """Запись индекса для файла с тем же именем и содержимым"""
+        for entry in reversed(self.entries()):
+            if (entry['file_name'] == file_name
+                    and entry['content_hash'] == content_hash):
+                return entry
+        return None
+
+    def files_by_date(self, date_str):
+        """Последние архивные версии файлов даты: тип -> запись индекса"""
+        files = {}
+        for entry in self.entries():
+            if entry['date'] == date_str:
+                files[entry['file_type']] = entry
+        return files
+
+    def dates(self):
+        """Даты, файлы которых есть в архиве"""
+        return sorted(
+            {entry['date'] for entry in self.entries()},
+            key=lambda d: datetime.strptime(d, '%d%m%Y')
+        )
+
+    def _read_block(self, f, entry, block):
+        """Чтение и распаковка одного блока"""
+        f.seek(block['offset'])
+        frame = f.read(block['length'])
+        if entry['compression'] == 'zstd':
+            if zstandard is None:
+                raise ArchiveError(
+                    f"Для чтения {entry['archive_name']} нужен zstandard"
+                )
+            return zstandard.ZstdDecompressor().decompress(frame)
+        return gzip.decompress(frame)
+
+    def iter_text_chunks(self, entry):
+        """
+        Текстовый файл из архива чанками по блокам (как iter_file_chunks)
+
+        Распаковывается один блок за раз; индекс строк сквозной
+        """
+        header = entry['header'].encode('utf-8')
+        path = os.path.join(self.archive_dir, entry['archive_name'])
+        with open(path, 'rb') as f:
+            for i, block in enumerate(entry['blocks']):
+                data = self._read_block(f, entry, block)
+                chunk = pd.read_csv(
+                    io.BytesIO(data if i == 0 else header + data),
+                    sep=';', dtype=str
+                )
+                chunk.index = pd.RangeIndex(
+                    block['first_row'], block['first_row'] + len(chunk)
+                )
+                yield chunk
+
+    def read_bytes(self, entry):
+        """Исходное содержимое файла из архива"""
+        path = os.path.join(self.archive_dir, entry['archive_name'])
+        with open(path, 'rb') as f:
+            return b''.join(
+                self._read_block(f, entry, block) for block in entry['blocks']
+            )
+
+    def read_excel(self, entry):
+        """xlsx-файл из архива в DataFrame"""
+        return pd.read_excel(io.BytesIO(self.read_bytes(entry)), dtype=str)
@@ -0,0 +1,106 @@
+"""
+Контрольные точки этапов загрузки даты (bank.meta_stage_checkpoint)
+
+Этап пишет контрольную точку при успешном завершении: этапы применения -
+в своей транзакции вместе с данными, staging - после фиксации COPY.
+Точка действительна, пока не изменились файлы, из которых получен
+результат этапа (input_hash), а для staging - пока staging-таблица
+содержит записанное число строк. Общие таблицы stg_*_temp переходят
+к дате, которая начинает в них загрузку: точки staging других дат
+на эти таблицы при этом удаляются.
+"""
+import hashlib
+import logging
+
+from sqlalchemy import text
+
+
+def input_hash(fingerprints, file_types):
+    """Хэш отпечатков файлов указанных типов (отсутствующие пропускаются)"""
+    digest = hashlib.sha256()
+    for file_type in sorted(file_types):
+        fingerprint = fingerprints.get(file_type)
+        if fingerprint is not None:
+            digest.update(
+                f"{file_type}:{fingerprint['content_hash']};".encode()
+            )
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """Чтение, запись и сброс контрольных точек дат"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.logger = logging.getLogger(__name__)
+
+    def load(self, load_date):
+        """Контрольные точки даты: имя этапа -> строка"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(
+                """
+                SELECT stage_name, input_hash, stg_table, rows_processed,
+                       rows_rejected, completed_at
+                FROM bank.meta_stage_checkpoint
+                WHERE load_date = :load_date
+                """
+            ), {'load_date': load_date}).fetchall()
+        return {row.stage_name: row for row in rows}
+
+    def save(self, conn, load_date, stage_name, input_hash, rows=None,
+             stg_table=None, rejected=0):
+        """Запись контрольной точки в транзакции conn (фиксирует вызывающий)"""
+        conn.execute(text(
+            """
+            INSERT INTO bank.meta_stage_checkpoint(
+                load_date, stage_name, input_hash, stg_table, rows_processed,
+                rows_rejected
+            ) VALUES (
+                :load_date, :stage_name, :input_hash, :stg_table, :rows,
+                :rejected
+            )
+            ON CONFLICT (load_date, stage_name) DO UPDATE SET
+                input_hash = EXCLUDED.input_hash,
+                stg_table = EXCLUDED.stg_table,
+                rows_processed = EXCLUDED.rows_processed,
+                rows_rejected = EXCLUDED.rows_rejected,
+                completed_at = CURRENT_TIMESTAMP
+            """
+        ), {
+            'load_date': load_date, 'stage_name': stage_name,
+            'input_hash': input_hash, 'stg_table': stg_table, 'rows': rows,
+            'rejected': rejected,
+        })
+
+    def reset(self, load_date):
+        """Сброс контрольных точек даты (загрузка заново)"""
+        with self.engine.connect() as conn:
+            conn.execute(text(
+                "DELETE FROM bank.meta_stage_checkpoint "
+                "WHERE load_date = :load_date"
+            ), {'load_date': load_date})
+            conn.commit()
+
+    def release(self, stg_table, load_date):
+        """Удаление точек staging других дат, записанных в stg_table"""
+        with self.engine.connect() as conn:
+            conn.execute(text(
+                """
+                DELETE FROM bank.meta_stage_checkpoint
+                WHERE stg_table = :stg_table AND load_date <> :load_date
+                """
+            ), {'stg_table': stg_table, 'load_date': load_date})
+            conn.commit()
+
+    def staged_rows(self, stg_table):
+        """Число строк staging-таблицы или None, если таблицы нет"""
+        with self.engine.connect() as conn:
+            exists = conn.execute(
+                text("SELECT to_regclass(:table)"),
+                {'table': f'bank.{stg_table}'}
+            ).scalar()
+            if exists is None:
+                return None
+            return conn.execute(
+                text(f"SELECT COUNT(*) FROM bank.{stg_table}")
+            ).scalar()
@@ -0,0 +1,348 @@
+"""
+Генератор синтетических данных для нагрузочного тестирования
+
+Создает справочники клиентов/счетов/карт, а также файлы транзакций,
+терминалов и черного списка паспортов в формате исходных файлов,
+с внедренными случаями мошенничества для всех четырех правил витрины.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .file_utils import TRANSACTIONS_COLUMNS, date_range
+
+
+CITIES = [
+    'Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань',
+    'Нижний Новгород', 'Челябинск', 'Самара', 'Омск', 'Ростов-на-Дону',
+    'Уфа', 'Красноярск', 'Воронеж', 'Пермь', 'Волгоград', 'Краснодар',
+    'Саратов', 'Тюмень', 'Ижевск', 'Барнаул'
+]
+STREETS = [
+    'ул. Ленина', 'пр. Мира', 'ул. Гагарина', 'ул. Садовая', 'пр. Победы',
+    'ул. Советская', 'ул. Лесная', 'ул. Школьная'
+]
+LAST_NAMES = ['Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов']
+FIRST_NAMES = ['Алексей', 'Дмитрий', 'Сергей', 'Андрей', 'Михаил', 'Иван']
+PATRONYMICS = ['Иванович', 'Петрович', 'Сергеевич', 'Андреевич', 'Олегович']
+
+# Группы карт с внедренным мошенничеством -> тип события в rep_fraud
+PLANTED_RULES = {
+    'expired_passport': 'Просроченный/заблокированный паспорт',
+    'blacklisted': 'Просроченный/заблокированный паспорт',
+    'expired_contract': 'Недействующий договор',
+    'two_cities': 'Операции в разных городах в течение часа',
+    'amount_guessing': 'Попытка подбора суммы',
+}
+
+CLIENT_PREFIX = 'BENCH-'
+
+
+def _zfill(values, width):
+    """Векторное форматирование целых чисел с ведущими нулями"""
+    return pd.Series(values).astype(str).str.zfill(width)
+
+
+def _format_card_nums(indexes):
+    """Номера карт вида '9000 0000 0000 0001' (префикс 9 не пересекается)"""
+    digits = '9' + _zfill(indexes, 15)
+    return (
+        digits.str[0:4] + ' ' + digits.str[4:8] + ' '
+        + digits.str[8:12] + ' ' + digits.str[12:16]
+    )
+
+
+def _format_amounts(cents):
+    """Суммы в формате исходного файла: '1046,40'"""
+    cents = pd.Series(cents)
+    return (cents // 100).astype(str) + ',' + _zfill(cents % 100, 2)
+
+
+def _terminal_ids(prefix, cities, slots, terminals_per_city):
+    """Идентификатор терминала по городу и номеру слота в городе"""
+    return prefix + _zfill(
+        np.asarray(cities) * terminals_per_city + np.asarray(slots), 6
+    )
+
+
+class SyntheticDataset:
+    """
+    Синтетический набор данных за период
+
+    n_cards обычных карт совершают операции только в терминалах
+    "своего" города; для каждой группы PLANTED_RULES резервируется
+    planted_per_day карт на каждый день периода.
+    """
+
+    def __init__(self, start_date, days, rows_per_day, n_cards=100000,
+                 planted_per_day=10, terminals_per_city=50, seed=42):
+        self.dates = date_range(
+            start_date,
+            (datetime.strptime(start_date, '%d%m%Y')
+             + timedelta(days=days - 1)).strftime('%d%m%Y')
+        )
+        self.rows_per_day = rows_per_day
+        self.n_cards = n_cards
+        self.planted_per_day = planted_per_day
+        self.terminals_per_city = terminals_per_city
+        self.seed = seed
+
+        # Диапазоны индексов карт по группам
+        self.groups = {'normal': (0, n_cards)}
+        offset = n_cards
+        for group in PLANTED_RULES:
+            size = planted_per_day * len(self.dates)
+            self.groups[group] = (offset, offset + size)
+            offset += size
+        self.total_cards = offset
+
+        rng = np.random.default_rng(seed)
+        self.home_city = rng.integers(0, len(CITIES), self.total_cards)
+        self.card_nums = _format_card_nums(
+            np.arange(self.total_cards)
+        ).to_numpy()
+        self.passports = (
+            _zfill(4000 + np.arange(self.total_cards) // 1000000, 4) + ' '
+            + _zfill(np.arange(self.total_cards) % 1000000, 6)
+        ).to_numpy()
+
+    def _group_cards(self, group, day_index):
+        """Карты группы, зарезервированные для дня с номером day_index"""
+        start = self.groups[group][0] + day_index * self.planted_per_day
+        return np.arange(start, start + self.planted_per_day)
+
+    def reference_data(self):
+        """Справочники clients, accounts, cards в виде DataFrame"""
+        rng = np.random.default_rng(self.seed + 1)
+        n = self.total_cards
+        ids = np.arange(n)
+
+        passport_valid_to = np.full(n, '2045-01-01', dtype=object)
+        start, end = self.groups['expired_passport']
+        passport_valid_to[start:end] = '2001-01-01'
+
+        account_valid_to = np.full(n, '2040-01-01', dtype=object)
+        start, end = self.groups['expired_contract']
+        account_valid_to[start:end] = '2001-01-01'
+
+        client_ids = CLIENT_PREFIX + _zfill(ids, 9)
+        accounts = '40817810' + _zfill(ids, 12)
+        birth = (
+            pd.Timestamp('1950-01-01')
+            + pd.to_timedelta(rng.integers(0, 18000, n), unit='D')
+        )
+
+        clients = pd.DataFrame({
+            'client_id': client_ids,
+            'last_name': rng.choice(LAST_NAMES, n),
+            'first_name': rng.choice(FIRST_NAMES, n),
+            'patronymic': rng.choice(PATRONYMICS, n),
+            'date_of_birth': birth.strftime('%Y-%m-%d'),
+            'passport_num': self.passports,
+            'passport_valid_to': passport_valid_to,
+            'phone': '+7 9' + _zfill(rng.integers(0, 10**9, n), 9),
+            'create_dt': '1900-01-01',
+            'update_dt': None,
+        })
+        accounts_df = pd.DataFrame({
+            'account': accounts,
+            'valid_to': account_valid_to,
+            'client': client_ids,
+            'create_dt': '1900-01-01',
+            'update_dt': None,
+        })
+        cards = pd.DataFrame({
+            'card_num': self.card_nums,
+            'account': accounts,
+            'create_dt': '2001-01-01',
+            'update_dt': None,
+        })
+        return {'clients': clients, 'accounts': accounts_df, 'cards': cards}
+
+    def terminals(self):
+        """Справочник терминалов (одинаковый снимок на каждый день)"""
+        rng = np.random.default_rng(self.seed + 2)
+        cities = np.repeat(np.arange(len(CITIES)), self.terminals_per_city)
+        slots = np.tile(np.arange(self.terminals_per_city), len(CITIES))
+        frames = []
+        for prefix, terminal_type in (('BP', 'POS'), ('BA', 'ATM')):
+            addresses = (
+                'г. ' + pd.Series(np.array(CITIES)[cities]) + ', '
+                + pd.Series(rng.choice(STREETS, len(cities))) + ', д. '
+                + pd.Series(rng.integers(1, 100, len(cities))).astype(str)
+            )
+            frames.append(pd.DataFrame({
+                'terminal_id': _terminal_ids(
+                    prefix, cities, slots, self.terminals_per_city
+                ),
+                'terminal_type': terminal_type,
+                'terminal_city': np.array(CITIES)[cities],
+                'terminal_address': addresses,
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def _planted(self, day_index, day):
+        """Транзакции и ожидаемые события внедренного мошенничества"""
+        rng = np.random.default_rng(self.seed + 100 + day_index)
+        rows = []
+        expected = []
+
+        def add(card, at, amount_cents, oper_type, result, city, kind):
+            prefix = 'BP' if oper_type == 'PAYMENT' else 'BA'
+            rows.append({
+                'transaction_date': at,
+                'amount_cents': amount_cents,
+                'card': card,
+                'oper_type': oper_type,
+                'oper_result': result,
+                'terminal': _terminal_ids(
+                    prefix, [city], [rng.integers(self.terminals_per_city)],
+                    self.terminals_per_city
+                ).iloc[0],
+            })
+            if kind:
+                expected.append({
+                    'event_dt': at,
+                    'passport': self.passports[card],
+                    'event_type': PLANTED_RULES[kind],
+                })
+
+        def random_time(margin_seconds=0):
+            seconds = int(rng.integers(3600, 86400 - 3600 - margin_seconds))
+            return day + timedelta(seconds=seconds)
+
+        for group in ('expired_passport', 'blacklisted', 'expired_contract'):
+            for card in self._group_cards(group, day_index):
+                add(card, random_time(), int(rng.integers(10000, 500000)),
+                    'PAYMENT', 'SUCCESS', self.home_city[card], group)
+
+        for card in self._group_cards('two_cities', day_index):
+            at = random_time()
+            city = self.home_city[card]
+            other_city = (city + 1) % len(CITIES)
+            add(card, at, 150000, 'PAYMENT', 'SUCCESS', city, 'two_cities')
+            add(card, at + timedelta(minutes=30), 250000, 'WITHDRAW',
+                'SUCCESS', other_city, None)
+
+        for card in self._group_cards('amount_guessing', day_index):
+            at = random_time()
+            city = self.home_city[card]
+            amounts = [900000, 700000, 500000, 300000]
+            for step, amount in enumerate(amounts):
+                last = step == len(amounts) - 1
+                add(card, at + timedelta(minutes=5 * step), amount,
+                    'PAYMENT', 'SUCCESS' if last else 'REJECT', city,
+                    'amount_guessing' if last else None)
+
+        blacklist = pd.DataFrame({
+            'date': day,
+            'passport': self.passports[
+                self._group_cards('blacklisted', day_index)
+            ],
+        })
+        return pd.DataFrame(rows), pd.DataFrame(expected), blacklist
+
+    def _transactions_chunks(self, day_index, day, planted, chunk_size):
+        """Генерация транзакций дня чанками, упорядоченными по времени"""
+        rng = np.random.default_rng(self.seed + 1000 + day_index)
+        n_chunks = max(1, -(-self.rows_per_day // chunk_size))
+        slice_seconds = 86400 / n_chunks
+        id_base = (day_index + 1) * 10**10
+        normal_start, normal_end = self.groups['normal']
+
+        for i in range(n_chunks):
+            size = min(chunk_size, self.rows_per_day - i * chunk_size)
+            seconds = np.sort(
+                rng.uniform(i * slice_seconds, (i + 1) * slice_seconds, size)
+            ).astype('int64')
+            cards = rng.integers(normal_start, normal_end, size)
+            oper_type = rng.choice(
+                ['PAYMENT', 'WITHDRAW', 'DEPOSIT'], size, p=[0.5, 0.3, 0.2]
+            )
+            chunk = pd.DataFrame({
+                'transaction_date': (
+                    day + pd.to_timedelta(seconds, unit='s')
+                ),
+                'amount_cents': rng.integers(10000, 1000000, size),
+                'card': cards,
+                'oper_type': oper_type,
+                'oper_result': np.where(
+                    rng.random(size) < 0.03, 'REJECT', 'SUCCESS'
+                ),
+                'terminal': _terminal_ids(
+                    np.where(oper_type == 'PAYMENT', 'BP', 'BA').astype(object),
+                    self.home_city[cards],
+                    rng.integers(0, self.terminals_per_city, size),
+                    self.terminals_per_city
+                ),
+            })
+
+            # Внедренные транзакции попадают в чанк своего интервала времени
+            offsets = (
+                planted['transaction_date'] - day
+            ).dt.total_seconds() if len(planted) else pd.Series(dtype=float)
+            in_slice = (
+                (offsets >= i * slice_seconds)
+                & (offsets < (i + 1) * slice_seconds)
+            )
+            chunk = pd.concat([chunk, planted[in_slice]], ignore_index=True)
+            chunk = chunk.sort_values('transaction_date', kind='stable')
+
+            yield pd.DataFrame({
+                'transaction_id': (
+                    id_base + i * (chunk_size + len(planted))
+                    + np.arange(len(chunk))
+                ),
+                'transaction_date': chunk['transaction_date'].to_numpy(),
+                'amount': _format_amounts(
+                    chunk['amount_cents'].to_numpy()
+                ).to_numpy(),
+                'card_num': self.card_nums[chunk['card'].to_numpy()],
+                'oper_type': chunk['oper_type'].to_numpy(),
+                'oper_result': chunk['oper_result'].to_numpy(),
+                'terminal': chunk['terminal'].to_numpy(),
+            })[TRANSACTIONS_COLUMNS]
+
+    def write_files(self, files_dir, expected_dir, chunk_size=500000):
+        """
+        Запись файлов за все дни периода
+
+        Возвращает словарь дата -> DataFrame ожидаемых событий
+        """
+        os.makedirs(files_dir, exist_ok=True)
+        os.makedirs(expected_dir, exist_ok=True)
+        terminals = self.terminals()
+        expected_by_date = {}
+
+        for day_index, date_str in enumerate(self.dates):
+            day = pd.Timestamp(datetime.strptime(date_str, '%d%m%Y'))
+            planted, expected, blacklist = self._planted(day_index, day)
+
+            path = os.path.join(files_dir, f'transactions_{date_str}.txt')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                for i, chunk in enumerate(self._transactions_chunks(
+                        day_index, day, planted, chunk_size)):
+                    chunk.to_csv(
+                        f, sep=';', index=False, header=(i == 0),
+                        date_format='%Y-%m-%d %H:%M:%S'
+                    )
+
+            terminals.to_excel(
+                os.path.join(files_dir, f'terminals_{date_str}.xlsx'),
+                index=False
+            )
+            blacklist.to_excel(
+                os.path.join(
+                    files_dir, f'passport_blacklist_{date_str}.xlsx'
+                ),
+                index=False
+            )
+            expected.to_csv(
+                os.path.join(expected_dir, f'expected_fraud_{date_str}.csv'),
+                sep=';', index=False
+            )
+            expected_by_date[date_str] = expected
+
+        return expected_by_date
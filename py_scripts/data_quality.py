@@ -0,0 +1,189 @@
+"""
+Проверка качества исходных данных перед загрузкой в staging
+
+Проверки выполняются над колонками целиком (векторно, без циклов
+по строкам): строки, не прошедшие хотя бы одну проверку, отделяются
+с перечнем причин и пишутся в файл карантина, остальные приводятся
+к типам staging-таблиц и загружаются.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+BLACKLIST_COLUMNS = ['date', 'passport']
+TERMINALS_COLUMNS = [
+    'terminal_id', 'terminal_type', 'terminal_city', 'terminal_address'
+]
+
+OPER_TYPES = ['PAYMENT', 'DEPOSIT', 'WITHDRAW']
+OPER_RESULTS = ['SUCCESS', 'REJECT']
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+ID_PATTERN = r'\d{1,128}'
+# DECIMAL(15,2) staging: до 13 знаков целой части, разделитель ',' или '.'
+AMOUNT_PATTERN = r'\d{1,13}(?:[.,]\d{1,2})?'
+CARD_PATTERN = r'\d{4} \d{4} \d{4} \d{4}'
+TERMINAL_PATTERN = r'[A-Za-z0-9_-]{1,128}'
+PASSPORT_PATTERN = r'\d{4} \d{6}'
+
+REASON_COLUMN = 'reject_reason'
+LINE_COLUMN = 'line_number'
+
+
+class QualityError(ValueError):
+    """Доля отклоненных строк превышает допустимую"""
+
+
+def _mismatch(series, pattern):
+    """Значение пустое или не соответствует шаблону целиком"""
+    return ~series.str.fullmatch(pattern).fillna(False).astype(bool)
+
+
+def _split(frame, checks):
+    """
+    Разделение строк на прошедшие проверки и отклоненные
+
+    checks - список (причина, маска ошибочных строк). Возвращает маску
+    ошибочных строк и серию причин через '; ' (пустая для прошедших)
+    """
+    bad = np.zeros(len(frame), dtype=bool)
+    reasons = pd.Series('', index=frame.index, dtype=object)
+    for reason, mask in checks:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            reasons[mask] = reasons[mask] + reason + '; '
+            bad |= mask
+    return bad, reasons.str.rstrip('; ')
+
+
+def _rejected(frame, bad, reasons):
+    """Отклоненные строки с номером строки файла и причинами"""
+    rejected = frame[bad].copy()
+    # Номер строки в файле: индекс чанка сквозной, плюс строка заголовка
+    rejected.insert(0, LINE_COLUMN, frame.index[bad] + 2)
+    rejected[REASON_COLUMN] = reasons[bad]
+    return rejected
+
+
+def check_transactions(frame, load_date, terminals=None):
+    """
+    Проверка и приведение типов чанка транзакций
+
+    load_date - дата загрузки (Timestamp): время операции должно быть
+    не раньше предыдущего дня и не позже следующего (перенос через
+    полночь); terminals - известные идентификаторы терминалов
+    (Index), проверка ссылки пропускается, если их нет.
+    Возвращает (чистые строки с типами staging, отклоненные строки)
+    """
+    amount = pd.to_numeric(
+        frame['amount'].str.replace(',', '.', regex=False), errors='coerce'
+    )
+    timestamp = pd.to_datetime(
+        frame['transaction_date'], format=TIMESTAMP_FORMAT, errors='coerce'
+    )
+    checks = [
+        ('transaction_id: пусто или не число',
+         _mismatch(frame['transaction_id'], ID_PATTERN)),
+        ('transaction_id: повтор в файле',
+         frame['transaction_id'].duplicated(keep='first')
+         & frame['transaction_id'].notna()),
+        ('amount: не сумма', _mismatch(frame['amount'], AMOUNT_PATTERN)),
+        ('transaction_date: не время ГГГГ-ММ-ДД ЧЧ:ММ:СС', timestamp.isna()),
+        ('transaction_date: вне даты загрузки',
+         timestamp.notna()
+         & ((timestamp < load_date - pd.Timedelta(days=1))
+            | (timestamp >= load_date + pd.Timedelta(days=2)))),
+        ('card_num: не номер карты', _mismatch(frame['card_num'], CARD_PATTERN)),
+        ('oper_type: неизвестный тип', ~frame['oper_type'].isin(OPER_TYPES)),
+        ('oper_result: неизвестный результат',
+         ~frame['oper_result'].isin(OPER_RESULTS)),
+        ('terminal: пусто или недопустимые символы',
+         _mismatch(frame['terminal'], TERMINAL_PATTERN)),
+    ]
+    if terminals is not None and len(terminals):
+        checks.append((
+            'terminal: неизвестный терминал',
+            frame['terminal'].notna() & ~frame['terminal'].isin(terminals)
+        ))
+
+    bad, reasons = _split(frame, checks)
+    clean = frame[~bad].assign(
+        amount=amount[~bad], transaction_date=timestamp[~bad]
+    )
+    return clean, _rejected(frame, bad, reasons)
+
+
+def check_blacklist(frame):
+    """Проверка и приведение типов черного списка паспортов"""
+    date = pd.to_datetime(frame['date'], errors='coerce').dt.normalize()
+    checks = [
+        ('date: не дата', date.isna()),
+        ('passport: не номер паспорта',
+         _mismatch(frame['passport'], PASSPORT_PATTERN)),
+    ]
+    bad, reasons = _split(frame, checks)
+    return frame[~bad].assign(date=date[~bad]), _rejected(frame, bad, reasons)
+
+
+def check_terminals(frame):
+    """
+    Проверка снимка терминалов
+
+    Отклоняются только строки с непригодным ключом: терминал, исключенный
+    из снимка из-за ошибки в атрибутах, загрузка SCD2 сочла бы удаленным
+    """
+    checks = [
+        ('terminal_id: пусто или недопустимые символы',
+         _mismatch(frame['terminal_id'], TERMINAL_PATTERN)),
+        ('terminal_id: повтор в снимке',
+         frame['terminal_id'].duplicated(keep='first')
+         & frame['terminal_id'].notna()),
+    ]
+    bad, reasons = _split(frame, checks)
+    return frame[~bad], _rejected(frame, bad, reasons)
+
+
+class Quarantine:
+    """
+    Файл карантина отклоненных строк одного исходного файла
+
+    Строки дописываются по чанкам в <каталог>/<имя файла>.rejected.csv;
+    файл создается при первой отклоненной строке
+    """
+
+    def __init__(self, quarantine_dir, file_path, max_reject_share=1.0):
+        self.path = os.path.join(
+            quarantine_dir, f"{os.path.basename(file_path)}.rejected.csv"
+        )
+        self.file_path = file_path
+        self.max_reject_share = max_reject_share
+        self.checked = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        # Карантин прежнего запуска по тому же файлу заменяется
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, rejected, checked):
+        """Запись отклоненных строк чанка из checked проверенных"""
+        with self._lock:
+            if len(rejected):
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                rejected.to_csv(
+                    self.path, sep=';', index=False,
+                    mode='a', header=self.rejected == 0
+                )
+            self.checked += checked
+            self.rejected += len(rejected)
+
+    def verify(self):
+        """Ошибка, если доля отклоненных строк превышает допустимую"""
+        if self.checked and self.rejected / self.checked > self.max_reject_share:
+            raise QualityError(
+                f"В файле {self.file_path} отклонено {self.rejected} из "
+                f"{self.checked} строк (допустимо "
+                f"{self.max_reject_share:.0%}), см. {self.path}"
+            )
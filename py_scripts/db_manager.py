@@ -1,45 +1,157 @@
+import hashlib
 import logging
-from .db_utils import execute_sql_script
+import os
+import re
+
+import psycopg2.errors
+
+
+# Файлы миграций: V001__описание.sql
+MIGRATION_PATTERN = re.compile(r'^V(\d+)__(\w+)\.sql$')
+
+# Ключ advisory-блокировки, чтобы миграции не применялись параллельно
+MIGRATION_LOCK_ID = 4242001
 
 
 class DBManager:
     """Управляет жизненным циклом базы данных"""
-    
+
     def __init__(self, config):
         self.config = config
         self.logger = logging.getLogger(__name__)
-        
+
     def ensure_database_ready(self, connection):
-        """Проверяет готовность БД и создает недостающие элементы"""
+        """
+        Проверяет версию схемы и применяет недостающие миграции
+
+        Если схема актуальна, выполняется один запрос к bank.schema_version
+        """
         try:
-            # Создание схемы
-            self._create_schema(connection)
-            
-            # Всегда создаем таблицы
-            self._create_tables(connection)
-            
+            migrations = self._load_migrations()
+            applied = self._applied_migrations(connection)
+
+            if applied is not None and self._is_current(migrations, applied):
+                return
+
+            self._apply_migrations(connection, migrations)
+
         except Exception as e:
             self.logger.error(f"Ошибка при инициализации БД: {str(e)}")
             raise
-        
-    def _create_schema(self, connection):
-        """Создание схемы bank"""
+
+    def _load_migrations(self):
+        """Список миграций (версия, имя, путь, контрольная сумма)"""
+        migrations_dir = self.config['paths']['migrations_sql']
+        migrations = []
+
+        for file_name in sorted(os.listdir(migrations_dir)):
+            match = MIGRATION_PATTERN.match(file_name)
+            if not match:
+                continue
+            path = os.path.join(migrations_dir, file_name)
+            with open(path, 'rb') as f:
+                checksum = hashlib.sha256(f.read()).hexdigest()
+            migrations.append({
+                'version': int(match.group(1)),
+                'name': match.group(2),
+                'path': path,
+                'checksum': checksum,
+            })
+
+        return sorted(migrations, key=lambda m: m['version'])
+
+    def _applied_migrations(self, connection):
+        """
+        Примененные миграции: версия -> контрольная сумма
+
+        None, если таблица версий еще не создана
+        """
+        cursor = connection.cursor()
         try:
-            cursor = connection.cursor()
-            cursor.execute("CREATE SCHEMA IF NOT EXISTS bank")
+            cursor.execute(
+                "SELECT version, checksum FROM bank.schema_version"
+            )
+        except (psycopg2.errors.UndefinedTable,
+                psycopg2.errors.InvalidSchemaName):
+            connection.rollback()
+            return None
+        applied = dict(cursor.fetchall())
+        connection.commit()
+        return applied
+
+    def _is_current(self, migrations, applied):
+        """Проверка, что все миграции применены и не изменялись"""
+        for migration in migrations:
+            checksum = applied.get(migration['version'])
+            if checksum is None:
+                return False
+            if checksum != migration['checksum']:
+                raise ValueError(
+                    f"Миграция V{migration['version']:03d} "
+                    f"({migration['name']}) изменена после применения: "
+                    f"контрольная сумма не совпадает"
+                )
+        return True
+
+    def _apply_migrations(self, connection, migrations):
+        """Применение недостающих миграций под advisory-блокировкой"""
+        cursor = connection.cursor()
+        cursor.execute("CREATE SCHEMA IF NOT EXISTS bank")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bank.schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255),
+                checksum VARCHAR(64),
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        connection.commit()
+
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            # Перечитываем версии под блокировкой: их мог применить
+            # параллельный процесс
+            applied = self._applied_migrations(connection) or {}
+            self._is_current(
+                [m for m in migrations if m['version'] in applied], applied
+            )
+
+            for migration in migrations:
+                if migration['version'] in applied:
+                    continue
+                self._apply_migration(connection, migration)
+        finally:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,)
+            )
             connection.commit()
-        except Exception as e:
-            self.logger.error(f"Ошибка при создании схемы: {str(e)}")
-            raise
-            
-    def _create_tables(self, connection):
-        """Создание всех таблиц из DDL-скрипта"""
+
+    def _apply_migration(self, connection, migration):
+        """Применение одной миграции в отдельной транзакции"""
+        self.logger.info(
+            f"Применяю миграцию V{migration['version']:03d}: "
+            f"{migration['name']}"
+        )
+        with open(migration['path'], 'r', encoding='utf-8') as f:
+            sql = f.read()
+
+        cursor = connection.cursor()
         try:
-            execute_sql_script(
-                connection, 
-                self.config['paths']['ddl_sql'], 
-                'create_tables'
+            cursor.execute(sql)
+            cursor.execute(
+                """
+                INSERT INTO bank.schema_version(version, name, checksum)
+                VALUES (%s, %s, %s)
+                """,
+                (migration['version'], migration['name'],
+                 migration['checksum'])
             )
+            connection.commit()
         except Exception as e:
-            self.logger.error(f"Ошибка при создании таблиц: {str(e)}")
+            connection.rollback()
+            self.logger.error(
+                f"Ошибка в миграции V{migration['version']:03d}: {str(e)}"
+            )
             raise
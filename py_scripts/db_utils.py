@@ -1,71 +1,123 @@
-import psycopg2
 import logging
-from sqlalchemy import create_engine
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, text
 
 
-def get_connection(config):
-    """Создаёт соединение c БД"""
+def get_engine(config):
+    """
+    Создаёт движок SQLAlchemy с пулом соединений
+
+    Пул общий для всех компонентов процесса: запросы SQLAlchemy
+    и DBAPI-соединения (raw_connection) для COPY и миграций.
+    Параметры пула - секция db.pool в config.json
+    """
     db = config["db"]
-    return psycopg2.connect(
-        host=db["host"],
-        port=db["port"],
-        dbname=db["dbname"],
-        user=db["user"],
-        password=db["password"]
-    )
+    pool = db.get("pool", {})
 
+    connect_args = {
+        "connect_timeout": int(pool.get("connect_timeout_sec", 10))
+    }
+    statement_timeout = int(pool.get("statement_timeout_ms", 0))
+    if statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
 
-def get_engine(config):
-    """Создаёт движок SQLAlchemy для загрузки из файлов"""
-    db = config["db"]
     return create_engine(
-        f"postgresql://{db['user']}:{db['password']}@"
-        f"{db['host']}:{db['port']}/{db['dbname']}"
+        f"postgresql+psycopg2://{db['user']}:{db['password']}@"
+        f"{db['host']}:{db['port']}/{db['dbname']}",
+        pool_size=int(pool.get("size", 5)),
+        max_overflow=int(pool.get("max_overflow", 10)),
+        pool_timeout=float(pool.get("timeout_sec", 30)),
+        pool_recycle=int(pool.get("recycle_sec", 1800)),
+        pool_pre_ping=True,
+        query_cache_size=int(pool.get("statement_cache_size", 500)),
+        connect_args=connect_args
     )
 
 
-def execute_sql_script(connection, sql_dir, script_name, params=None):
-    """Выполняет SQL-скрипт из указанного по шаблону файла"""
-    logger = logging.getLogger(__name__)
-    path = f"{sql_dir}/{script_name}.sql"
-    
-    logger.info(f"Выполняю SQL-скрипт: {path}")
-    
-    with open(path, 'r', encoding='utf-8') as f:
-        sql = f.read()
-        if params:
-            sql = sql.format(**params)
-        
-        # Разбиваем на команды
-        commands = [cmd.strip() for cmd in sql.split(';') if cmd.strip()]
-        logger.info(f"Найдено {len(commands)} команд для выполнения")
-        
-        cursor = connection.cursor()
-        
-        for i, command in enumerate(commands, 1):
-            if command:
-                # Убираем комментарии из начала команды
-                clean_command = command
-                lines = command.split('\n')
-                clean_lines = []
-                
-                for line in lines:
-                    line = line.strip()
-                    if line and not line.startswith('--'):
-                        clean_lines.append(line)
-                
-                if clean_lines:
-                    clean_command = ' '.join(clean_lines)
-                    
-                    try:
-                        logger.info(f"Выполняю команду {i}: "
-                                   f"{clean_command[:50]}...")
-                        cursor.execute(clean_command)
-                        logger.info(f"Команда {i} выполнена успешно")
-                    except Exception as e:
-                        logger.error(f"ОШИБКА в команде {i}: {str(e)}")
-                        logger.error(f"Команда: {clean_command}")
-                        raise
-        
+@contextmanager
+def raw_connection(engine):
+    """
+    DBAPI-соединение psycopg2 из пула движка
+
+    Фиксирует транзакцию при успешном выходе, откатывает при ошибке
+    и возвращает соединение в пул
+    """
+    connection = engine.raw_connection()
+    try:
+        yield connection
         connection.commit()
-        logger.info("SQL-скрипт выполнен успешно")
\ No newline at end of file
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def execute_statements(connection, sql, params=None, on_statement=None):
+    """
+    Выполняет SQL-текст по командам через соединение SQLAlchemy
+
+    Возвращает список строк-результатов каждой команды (для RETURNING).
+    on_statement(номер, команда, время, строк) вызывается после каждой команды
+    """
+    logger = logging.getLogger(__name__)
+    # Строки-комментарии убираются до разбиения: ';' в их тексте
+    # не должна делить команду
+    sql = '\n'.join(
+        line for line in sql.split('\n')
+        if not line.strip().startswith('--')
+    )
+    commands = [cmd.strip() for cmd in sql.split(';') if cmd.strip()]
+    results = []
+
+    for i, command in enumerate(commands, 1):
+
+        started = time.perf_counter()
+        result = connection.execute(text(command), params or {})
+        rows = result.fetchall() if result.returns_rows else []
+        elapsed = time.perf_counter() - started
+
+        logger.info(
+            f"Команда {i} выполнена за {elapsed:.3f} с, "
+            f"строк: {result.rowcount}"
+        )
+        if on_statement:
+            on_statement(i, command, elapsed, result.rowcount)
+        results.append(rows)
+
+    return results
+
+
+def copy_to_table(connection, table_name, source, columns, sep=';'):
+    """
+    Загружает данные в таблицу через COPY FROM STDIN
+
+    source - открытый файл или буфер (StringIO) в формате CSV без заголовка
+    Возвращает количество загруженных строк
+    """
+    logger = logging.getLogger(__name__)
+    column_list = ', '.join(columns)
+    command = (
+        f"COPY {table_name} ({column_list}) FROM STDIN "
+        f"WITH (FORMAT csv, DELIMITER '{sep}')"
+    )
+
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    cursor.copy_expert(command, source)
+    rows = cursor.rowcount
+    elapsed = time.perf_counter() - started
+
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    logger.info(
+        f"COPY в {table_name}: {rows} строк за {elapsed:.2f} с "
+        f"({rate:.0f} строк/с)"
+    )
+    return rows
+
+
+def truncate_table(connection, table_name):
+    """Очищает таблицу перед загрузкой"""
+    cursor = connection.cursor()
+    cursor.execute(f"TRUNCATE TABLE {table_name}")
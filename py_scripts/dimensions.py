@@ -0,0 +1,69 @@
+"""
+Описание измерений SCD2
+
+Каждое измерение задается таблицей истории, staging-таблицей снимка,
+ключом и отслеживаемыми колонками. Все измерения загружаются по
+общему шаблону load_dimensions.sql: версия строки сравнивается
+по хэшу отслеживаемых колонок, вставки, изменения и удаления
+определяются одним соединением снимка с текущими версиями.
+"""
+
+
+class Dimension:
+    """Описание измерения SCD2"""
+
+    def __init__(self, table, source, keys, columns, file_type=None):
+        # Таблица истории (effective_from, effective_to, deleted_flg)
+        self.table = table
+        # staging-таблица снимка без суффикса: stg_terminals
+        self.source = source
+        # Естественный ключ измерения
+        self.keys = list(keys)
+        # Отслеживаемые колонки; типы в staging и в истории должны совпадать
+        self.columns = list(columns)
+        # Тип файла-снимка: измерение загружается, только если файл получен
+        self.file_type = file_type
+
+
+DIMENSIONS = [
+    Dimension(
+        'dwh_dim_terminals_hist', 'stg_terminals',
+        keys=['terminal_id'],
+        columns=['terminal_type', 'terminal_city', 'terminal_address'],
+        file_type='terminals'
+    ),
+]
+
+
+def build_scd2_sql(template, dimension, stg_suffix='temp'):
+    """Собирает запрос загрузки измерения из шаблона"""
+    def join(items, separator=', '):
+        return separator.join(items)
+
+    indent = ',\n        '
+
+    return template.format(
+        table=dimension.table,
+        source=dimension.source,
+        stg_suffix=stg_suffix,
+        keys=join(dimension.keys),
+        columns=join(dimension.columns),
+        join_keys=join(
+            (f"src.{k} = cur.{k}" for k in dimension.keys), ' AND '
+        ),
+        diff_keys=join(
+            f"COALESCE(src.{k}, cur.{k}) AS {k}" for k in dimension.keys
+        ),
+        # для удаленной строки сохраняются значения последней версии
+        diff_columns=join((
+            f"CASE WHEN src.row_hash IS NULL THEN cur.{c} ELSE src.{c} END "
+            f"AS {c}"
+            for c in dimension.columns
+        ), indent),
+        close_keys=join(
+            (f"tgt.{k} = diff.{k}" for k in dimension.keys), ' AND '
+        ),
+        update_columns=join(
+            (f"{c} = EXCLUDED.{c}" for c in dimension.columns), indent[:-4]
+        ),
+    )
@@ -1,74 +1,159 @@
 import pandas as pd
+import io
 import logging
 import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from psycopg2.extras import execute_values
 from sqlalchemy import text
 
 from .file_utils import (
-    get_files_by_date, load_file_to_df, archive_file, normalize_date
+    get_files_by_date, load_file_to_df, iter_file_chunks, validate_columns,
+    date_range, TRANSACTIONS_COLUMNS
+)
+from .db_utils import (
+    get_engine, raw_connection, copy_to_table, truncate_table,
+    execute_statements
+)
+from .archive import Archive
+from .checkpoints import CheckpointStore, input_hash
+from .data_quality import (
+    Quarantine, check_transactions, check_blacklist, check_terminals,
+    BLACKLIST_COLUMNS, TERMINALS_COLUMNS
 )
-from .db_utils import get_engine, get_connection
 from .db_manager import DBManager
+from .dimensions import DIMENSIONS, build_scd2_sql
+from .file_index import FileIndex, SNAPSHOT_FILE_TYPES
+from .ingest_cache import IngestCache
+from .meta_buffer import MetadataBuffer
+from . import fraud_engine
+from .fraud_report import (
+    build_report_query, build_summary_query, fetch_report, fetch_summary,
+    export_report, report_version
+)
+from .fraud_rules import (
+    FRAUD_RULES, build_fraud_report_sql, build_fraud_events_sql
+)
 from .load_config import load_config
+from .metrics import MetricsCollector
+from .report_cache import ReportCache, cache_key
+from .stage_graph import StageGraph
+
+
+STAGING_TABLES = ['stg_transactions', 'stg_passport_blacklist', 'stg_terminals']
+
+# Справочники-источники обогащения карт (см. миграцию V004)
+ENRICHMENT_SOURCES = ['cards', 'accounts', 'clients']
+
+# Таблицы с помесячным секционированием (см. миграцию V003)
+PARTITIONED_TABLES = ['dwh_fact_transactions', 'rep_fraud']
+
+
+def _stage_date_worker(config_path, date_str, resume=False, replay=False):
+    """Загрузка staging одной даты в отдельном процессе (backfill)"""
+    pipeline = ETLPipeline(config_path)
+    files = pipeline._date_files(date_str, replay)
+    pipeline._begin_date(date_str, resume)
+    pipeline._create_stage_tables(date_str)
+    try:
+        # Снимки справочников сравниваются с предыдущей датой, которая
+        # еще может быть не применена: они проверяются перед применением
+        pipeline._stage_files(
+            date_str, files, suffix=date_str, dedup_snapshots=False
+        )
+    except Exception as e:
+        logging.error(
+            f"Ошибка при загрузке staging за дату {date_str}: {str(e)}"
+        )
+        pipeline._log_meta_errors(date_str, files, e)
+        raise
+    finally:
+        pipeline._flush_metrics(date_str)
+    # Записи метаданных staging фиксируются вместе с этапами применения
+    return (
+        files, pipeline.file_fingerprints.pop(date_str, {}),
+        pipeline.meta.pop(date_str)
+    )
 
 
 class ETLPipeline:
     """Основной класс ETL-процесса"""
 
     def __init__(self, config_path="config.json"):
+        self.config_path = config_path
         self.config = load_config(config_path)
         self.engine = get_engine(self.config)
         self.db_manager = DBManager(self.config)
+        # Записи о времени выполнения этапов по датам
+        self.stage_timings = {}
+        self.metrics = MetricsCollector()
+        self.meta = MetadataBuffer()
+        self.file_index = FileIndex(self.engine)
+        cache_config = self.config.get('ingest_cache', {})
+        self.ingest_cache = IngestCache(
+            cache_config.get('dir'), cache_config.get('max_size_mb', 512)
+        )
+        self.report_cache = ReportCache(
+            self.config.get('report', {}).get('cache_entries', 64)
+        )
+        # Отпечатки файлов по датам до успешного завершения загрузки
+        self.file_fingerprints = {}
+        self.checkpoints = CheckpointStore(self.engine)
+        # Контрольные точки продолжаемых (--resume) дат
+        self.resume_points = {}
+        archive_config = self.config.get('archive', {})
+        self.archive = Archive(
+            self.config['paths']['archive_dir'],
+            archive_config.get('compression', 'gzip'),
+            int(archive_config.get('level', 6)),
+            int(archive_config.get('block_rows', 100000))
+        )
+        # Путь файла -> запись индекса архива для повторной загрузки
+        self.replay_sources = {}
 
-    def process_date(self, date_str):
+    def process_date(self, date_str, resume=False, replay=False):
         """
         Основной метод обработки данных за указанную дату
+
+        Staging загружается в постоянные таблицы stg_*_temp (без DDL
+        во время загрузки); отдельные таблицы stg_*_ДДММГГГГ создаются
+        только там, где даты загружаются одновременно (backfill,
+        режим наблюдения). С resume=True дата продолжается
+        с первого незавершенного этапа: этапы с действительной
+        контрольной точкой не выполняются повторно. С replay=True файлы
+        даты читаются из архива по его индексу
         """
         logging.info(f"Начинаю обработку данных за дату: {date_str}")
 
         # Получение файлов для указанной даты
-        files = get_files_by_date(self.config['paths']['files_dir'], date_str)
+        files = self._date_files(date_str, replay)
 
         if not any(files.values()):
+            if resume and self._date_completed(date_str):
+                logging.info(
+                    f"Дата {date_str} уже загружена, файлы в архиве"
+                )
+                return
             message = f"Не найдены файлы для даты {date_str}"
             logging.warning(message)
             raise FileNotFoundError(message)
 
         # Обработка каждого типа файлов
         try:
-            # 0. Инициализация БД и очистка staging
-            with get_connection(self.config) as conn:
+            # 0. Инициализация БД и контрольные точки даты
+            with raw_connection(self.engine) as conn:
                 self.db_manager.ensure_database_ready(conn)
-            
-            # 1. Загрузка транзакций
-            if files['transactions']:
-                count = self._process_transactions(files['transactions'])
-                self._log_meta_load(date_str, 'transactions', files['transactions'], count, 'SUCCESS')
-
-            # 2. Загрузка черного списка паспортов
-            if files['blacklist']:
-                count = self._process_blacklist(files['blacklist'])
-                self._log_meta_load(date_str, 'passport_blacklist', files['blacklist'], count, 'SUCCESS')
-
-            # 3. Загрузка терминалов
-            if files['terminals']:
-                count = self._process_terminals(files['terminals'])
-                self._log_meta_load(date_str, 'terminals', files['terminals'], count, 'SUCCESS')
-
-            # 4. Загрузка измерений
-            self._load_dimensions(date_str)
-            self._upsert_last_update('dwh_dim_terminals_hist', 'dimensions')
-
-            # 5. Загрузка фактов
-            self._load_facts(date_str)
-            self._upsert_last_update('dwh_fact_transactions', 'facts')
-            self._upsert_last_update('dwh_fact_passport_blacklist', 'facts')
-
-            # 6. Построение витрины мошенничества
-            self._build_fraud_report()
-            self._upsert_last_update('rep_fraud', 'report')
-
-            # 7. Архивирование файлов
-            self._archive_files(files)
+            self._begin_date(date_str, resume)
+
+            # 1-7. Граф этапов: staging, измерения, факты, витрина, архив
+            graph = StageGraph(self._scheduler_workers())
+            self._add_staging_stages(graph, date_str, files)
+            self._add_apply_stages(graph, date_str, files)
+            self._run_graph(graph, date_str)
+            self._register_files(date_str)
 
             logging.info(
                 f"Обработка данных за дату {date_str} завершена успешно"
@@ -78,168 +163,1222 @@ class ETLPipeline:
             logging.error(
                 f"Ошибка при обработке данных за дату {date_str}: {str(e)}"
             )
-            # Пишем неуспешные загрузки по известным файлам
+            self._log_meta_errors(date_str, files, e)
+            raise
+        finally:
+            self.file_fingerprints.pop(date_str, None)
+            self.resume_points.pop(date_str, None)
+            self._flush_meta(date_str)
+            self._flush_metrics(date_str)
+
+    def process_range(self, start_date, end_date, workers=None,
+                      resume=False, replay=False):
+        """
+        Загрузка данных за диапазон дат (backfill)
+
+        Разбор файлов и загрузка staging выполняются параллельно в пуле
+        процессов, каждая дата - в собственные staging-таблицы.
+        Измерения (SCD2), факты и витрина применяются строго по порядку дат.
+        Уже загруженные даты (файлы в архиве) в период не попадают,
+        с resume=True прерванные даты продолжаются по контрольным точкам.
+        С replay=True период загружается из архива: даты берутся из его
+        индекса, файлы читаются поблочно без распаковки архива целиком.
+        """
+        if workers is None:
+            workers = self.config.get('backfill', {}).get('workers')
+
+        if replay:
+            archived = set(self.archive.dates())
+            dates = [
+                d for d in date_range(start_date, end_date) if d in archived
+            ]
+        else:
+            files_dir = self.config['paths']['files_dir']
+            dates = [
+                d for d in date_range(start_date, end_date)
+                if any(get_files_by_date(files_dir, d).values())
+            ]
+        if not dates:
+            message = (
+                f"Не найдены файлы за период {start_date} - {end_date}"
+            )
+            logging.warning(message)
+            raise FileNotFoundError(message)
+
+        logging.info(
+            f"Backfill за {len(dates)} дат(ы): {dates[0]} - {dates[-1]}"
+        )
+        with raw_connection(self.engine) as conn:
+            self.db_manager.ensure_database_ready(conn)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                d: pool.submit(
+                    _stage_date_worker, self.config_path, d, resume, replay
+                )
+                for d in dates
+            }
             try:
-                if files.get('transactions'):
-                    self._log_meta_load(date_str, 'transactions', files['transactions'], 0, 'ERROR', str(e))
-                if files.get('blacklist'):
-                    self._log_meta_load(date_str, 'passport_blacklist', files['blacklist'], 0, 'ERROR', str(e))
-                if files.get('terminals'):
-                    self._log_meta_load(date_str, 'terminals', files['terminals'], 0, 'ERROR', str(e))
+                for date_str in dates:
+                    files, fingerprints, meta = futures[date_str].result()
+                    self.file_fingerprints[date_str] = fingerprints
+                    self.meta.extend(meta)
+                    try:
+                        # Без resume точки даты уже сброшены в процессе staging
+                        if resume:
+                            self._begin_date(date_str, resume)
+                        self._skip_loaded_snapshots(date_str, files, date_str)
+                        self._apply_date(date_str, files, suffix=date_str)
+                        self._register_files(date_str)
+                        self._drop_stage_tables(date_str)
+                        logging.info(
+                            f"Обработка данных за дату {date_str} "
+                            f"завершена успешно"
+                        )
+                    except Exception as e:
+                        logging.error(
+                            f"Ошибка при обработке данных за дату "
+                            f"{date_str}: {str(e)}"
+                        )
+                        self._log_meta_errors(date_str, files, e)
+                        raise
+                    finally:
+                        self.file_fingerprints.pop(date_str, None)
+                        self.resume_points.pop(date_str, None)
+                        self._flush_meta(date_str)
+                        self._flush_metrics(date_str)
             except Exception:
-                pass
-            raise
+                for future in futures.values():
+                    future.cancel()
+                raise
+
+        logging.info(f"Backfill завершен: обработано {len(dates)} дат(ы)")
+        return dates
+
+    def _date_files(self, date_str, replay=False):
+        """
+        Файлы даты: из каталога файлов или, при replay, из архива
+
+        Архивные файлы представлены путями в каталоге архива с исходными
+        именами; чтение по таким путям идет через индекс архива
+        """
+        if not replay:
+            return get_files_by_date(
+                self.config['paths']['files_dir'], date_str
+            )
+
+        archived = self.archive.files_by_date(date_str)
+        files = {}
+        for file_type, meta_type, _ in self._staging_handlers():
+            entry = archived.get(meta_type)
+            if entry is None:
+                files[file_type] = None
+                continue
+            path = os.path.join(self.archive.archive_dir, entry['file_name'])
+            self.replay_sources[path] = entry
+            files[file_type] = path
+        return files
+
+    def _fingerprint(self, file_path):
+        """Отпечаток файла (для архивного - из индекса архива)"""
+        entry = self.replay_sources.get(file_path)
+        if entry is None:
+            return self.file_index.fingerprint(file_path)
+        return {
+            'file_name': entry['file_name'],
+            'file_size': entry['file_size'],
+            'file_mtime': datetime.fromisoformat(entry['file_mtime']),
+            'content_hash': entry['content_hash'],
+        }
+
+    def _read_chunks(self, file_path):
+        """Текстовый файл чанками (архивный - по блокам архива)"""
+        entry = self.replay_sources.get(file_path)
+        if entry is None:
+            return iter_file_chunks(file_path, self._chunk_size())
+        return self.archive.iter_text_chunks(entry)
+
+    def _read_xlsx(self, file_path):
+        """xlsx-файл через кэш разобранных файлов (архивный - из архива)"""
+        entry = self.replay_sources.get(file_path)
+        if entry is None:
+            return load_file_to_df(file_path, "xlsx", cache=self.ingest_cache)
+        return self.ingest_cache.get_or_load(
+            file_path, partial(self.archive.read_excel, entry),
+            content_hash=entry['content_hash']
+        )
+
+    def _begin_date(self, date_str, resume=False):
+        """
+        Контрольные точки в начале загрузки даты
+
+        При продолжении (resume) точки читаются для проверки этапов,
+        иначе сбрасываются - дата загружается заново
+        """
+        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        if not resume:
+            self.checkpoints.reset(load_date)
+            return
+
+        points = self.checkpoints.load(load_date)
+        self.resume_points[date_str] = points
+        if points:
+            logging.info(
+                f"Продолжение даты {date_str}, завершенные этапы: "
+                f"{', '.join(sorted(points))}"
+            )
+        else:
+            logging.info(
+                f"Контрольных точек за дату {date_str} нет, загружаю заново"
+            )
+
+    def _date_completed(self, date_str):
+        """Дата загружена полностью (включая архивирование файлов)"""
+        with raw_connection(self.engine) as conn:
+            self.db_manager.ensure_database_ready(conn)
+        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        return 'archive_files' in self.checkpoints.load(load_date)
+
+    def _stage_inputs(self, date_str, file_types):
+        """Хэш отпечатков файлов даты, из которых получен результат этапа"""
+        return input_hash(self.file_fingerprints.get(date_str, {}), file_types)
+
+    def _resumed(self, date_str, stage_name, inputs):
+        """
+        Действительная контрольная точка этапа продолжаемой даты или None
+
+        Точка недействительна, если изменились исходные файлы этапа
+        """
+        point = self.resume_points.get(date_str, {}).get(stage_name)
+        if point is None or point.input_hash != inputs:
+            return None
+        return point
+
+    def _save_checkpoint(self, date_str, stage_name, inputs, rows=None,
+                         stg_table=None, conn=None, rejected=0):
+        """Запись контрольной точки этапа (в транзакции conn, если передана)"""
+        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        if conn is not None:
+            self.checkpoints.save(
+                conn, load_date, stage_name, inputs, rows, stg_table, rejected
+            )
+            return
+        with self.engine.connect() as own_conn:
+            self.checkpoints.save(
+                own_conn, load_date, stage_name, inputs, rows, stg_table,
+                rejected
+            )
+            own_conn.commit()
+
+    def _scheduler_workers(self):
+        """Число потоков для параллельного выполнения этапов"""
+        return self.config.get('scheduler', {}).get('max_workers', 3)
+
+    def _stage_files(self, date_str, files, suffix='temp',
+                     dedup_snapshots=True):
+        """Загрузка файлов за дату в staging-таблицы с указанным суффиксом"""
+        graph = StageGraph(self._scheduler_workers())
+        self._add_staging_stages(
+            graph, date_str, files, suffix, dedup_snapshots
+        )
+        return self._run_graph(graph, date_str)
+
+    def _apply_date(self, date_str, files, suffix='temp'):
+        """Применение загруженного staging: измерения, факты, витрина"""
+        graph = StageGraph(self._scheduler_workers())
+        self._add_apply_stages(graph, date_str, files, suffix)
+        return self._run_graph(graph, date_str)
+
+    def _add_staging_stages(self, graph, date_str, files, suffix='temp',
+                            dedup_snapshots=True):
+        """Этапы 1-3: независимая загрузка файлов в staging"""
+        for file_type, meta_type, handler in self._staging_handlers():
+            if files[file_type]:
+                graph.add(
+                    f'stage_{file_type}',
+                    partial(
+                        self._stage_file, date_str, meta_type,
+                        files[file_type], handler, suffix, dedup_snapshots
+                    )
+                )
+
+    def _staging_handlers(self):
+        """Тип файла, тип в meta_load_info и обработчик загрузки в staging"""
+        return [
+            ('transactions', 'transactions', self._process_transactions),
+            ('blacklist', 'passport_blacklist', self._process_blacklist),
+            ('terminals', 'terminals', self._process_terminals),
+        ]
+
+    def _add_apply_stages(self, graph, date_str, files, suffix='temp',
+                          after=()):
+        """
+        Этапы 4-7: измерения, факты, витрина и архивирование
+
+        after - этапы, после которых можно применять измерения и факты
+        (например, завершение предыдущей даты)
+        """
+        def staged(*file_types):
+            return [
+                f'stage_{t}' for t in file_types
+                if f'stage_{t}' in graph.stages
+            ] + list(after)
+
+        # 4. Загрузка измерений (нужен только staging терминалов)
+        graph.add(
+            'load_dimensions',
+            partial(self._run_dimensions, date_str, files, suffix),
+            depends_on=staged('terminals')
+        )
+        # Подготовка секций фактов и витрины под дату загрузки
+        graph.add(
+            'maintain_partitions',
+            partial(self._maintain_partitions, date_str)
+        )
+        # 5. Загрузка фактов (транзакции и черный список)
+        graph.add(
+            'load_facts',
+            partial(self._run_facts, date_str, suffix),
+            depends_on=staged('transactions', 'blacklist')
+            + ['maintain_partitions']
+        )
+        # Обновление обогащения карт данными договора и клиента
+        graph.add(
+            'refresh_enrichment',
+            partial(self._refresh_enrichment, date_str)
+        )
+        # 6. Построение витрины мошенничества
+        graph.add(
+            'build_fraud_report',
+            partial(self._run_fraud_report, date_str, suffix),
+            depends_on=['load_dimensions', 'load_facts', 'refresh_enrichment']
+        )
+        # 7. Архивирование файлов
+        graph.add(
+            'archive_files',
+            partial(self._run_archive, date_str, files),
+            depends_on=['build_fraud_report']
+        )
+
+    def _run_graph(self, graph, date_str):
+        """Выполнение графа этапов с сохранением записей о времени"""
+        for stage in graph.stages.values():
+            stage.func = self.metrics.wrap(date_str, stage.name, stage.func)
+        try:
+            return graph.run()
+        finally:
+            self.stage_timings[date_str] = {
+                **self.stage_timings.get(date_str, {}), **graph.timings
+            }
+            summary = ', '.join(
+                f"{name}={record.get('duration', 0):.2f}с"
+                for name, record in graph.timings.items()
+            )
+            logging.info(f"Время этапов за дату {date_str}: {summary}")
+
+    def _stage_file(self, date_str, meta_type, file_path, handler, suffix,
+                    dedup_snapshots=True):
+        """
+        Загрузка одного файла в staging с записью в meta_load_info
+
+        Файл, содержимое которого уже загружалось (для снимков справочников -
+        совпадающий с предыдущим снимком), не читается: staging-таблица
+        очищается, в meta_load_info пишется статус SKIPPED. Файлы,
+        загружаемые из архива (replay), уже зарегистрированы за свою дату
+        и проверку повторной доставки не проходят; снимки справочников
+        по-прежнему сравниваются с предыдущим снимком
+        """
+        fingerprint = self._fingerprint(file_path)
+        self.file_fingerprints.setdefault(date_str, {})[meta_type] = fingerprint
+        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        table_name = self._staging_table_name(file_path, suffix)
+        # Таблица переходит к этой дате: точки других дат на нее сбрасываются
+        self.checkpoints.release(table_name, load_date)
+
+        if meta_type in SNAPSHOT_FILE_TYPES:
+            dedup = dedup_snapshots
+        else:
+            dedup = file_path not in self.replay_sources
+        if dedup:
+            loaded = self.file_index.find_loaded(
+                meta_type, fingerprint, load_date
+            )
+            if loaded is not None:
+                return self._skip_file(
+                    date_str, meta_type, file_path, suffix, loaded
+                )
+
+        stage_name = f'stage_{meta_type}'
+        inputs = self._stage_inputs(date_str, [meta_type])
+        point = self._resumed(date_str, stage_name, inputs)
+        if (point is not None and point.stg_table == table_name
+                and self.checkpoints.staged_rows(table_name)
+                == point.rows_processed):
+            logging.info(
+                f"Файл {file_path} уже загружен в {table_name} "
+                f"({point.rows_processed} строк), пропускаю"
+            )
+            count, rejected = point.rows_processed, point.rows_rejected or 0
+        else:
+            count, rejected = handler(file_path, suffix)
+            self._save_checkpoint(
+                date_str, stage_name, inputs, count, table_name,
+                rejected=rejected
+            )
+        self._log_meta_load(
+            date_str, meta_type, file_path, count, 'SUCCESS',
+            records_rejected=rejected
+        )
+        return count
+
+    def _skip_file(self, date_str, meta_type, file_path, suffix, loaded):
+        """Пропуск уже загруженного файла с записью причины"""
+        table_name = self._staging_table_name(file_path, suffix)
+        with raw_connection(self.engine) as conn:
+            truncate_table(conn, f'bank.{table_name}')
+
+        reason = (
+            f"Содержимое совпадает с файлом {loaded.file_name}, "
+            f"загруженным за {loaded.load_date:%d.%m.%Y}"
+        )
+        logging.info(f"Файл {file_path} пропущен: {reason}")
+        self._log_meta_load(date_str, meta_type, file_path, 0, 'SKIPPED', reason)
+        return 0
+
+    def _skip_loaded_snapshots(self, date_str, files, suffix):
+        """
+        Пропуск снимков справочников, совпавших с предыдущим (backfill)
+
+        Вызывается перед применением даты, когда предыдущие даты
+        уже зарегистрированы
+        """
+        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        fingerprints = self.file_fingerprints.get(date_str, {})
+        for meta_type in SNAPSHOT_FILE_TYPES:
+            if meta_type not in fingerprints or not files.get(meta_type):
+                continue
+            loaded = self.file_index.find_loaded(
+                meta_type, fingerprints[meta_type], load_date
+            )
+            if loaded is not None:
+                self._skip_file(
+                    date_str, meta_type, files[meta_type], suffix, loaded
+                )
+
+    def _register_files(self, date_str):
+        """Регистрация отпечатков файлов успешно обработанной даты"""
+        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        fingerprints = self.file_fingerprints.pop(date_str, {})
+        self.file_index.register(load_date, fingerprints)
+
+    def _run_dimensions(self, date_str, files, suffix):
+        """Этап загрузки измерений (с метаданными - одна транзакция)"""
+        inputs = self._stage_inputs(date_str, ['terminals'])
+        if self._resumed(date_str, 'load_dimensions', inputs):
+            logging.info("Измерения за дату уже загружены, пропускаю")
+            return
+        with self.engine.connect() as conn:
+            tables = self._load_dimensions(conn, date_str, files, suffix)
+            for table in tables:
+                self._upsert_last_update(date_str, table, 'dimensions')
+            self.meta.flush(
+                conn, date_str, file_types=['terminals'], tables=tables
+            )
+            self._save_checkpoint(
+                date_str, 'load_dimensions', inputs, conn=conn
+            )
+            conn.commit()
+
+    def _run_facts(self, date_str, suffix):
+        """Этап загрузки фактов (с метаданными - одна транзакция)"""
+        inputs = self._stage_inputs(
+            date_str, ['transactions', 'passport_blacklist']
+        )
+        if self._resumed(date_str, 'load_facts', inputs):
+            logging.info("Факты за дату уже загружены, пропускаю")
+            return
+        tables = ['dwh_fact_transactions', 'dwh_fact_passport_blacklist']
+        with self.engine.connect() as conn:
+            self._load_facts(conn, date_str, suffix)
+            for table in tables:
+                self._upsert_last_update(date_str, table, 'facts')
+            self.meta.flush(
+                conn, date_str,
+                file_types=['transactions', 'passport_blacklist'],
+                tables=tables
+            )
+            self._save_checkpoint(date_str, 'load_facts', inputs, conn=conn)
+            conn.commit()
 
-    def _create_temp_table(self, data_frame, file_path):
-        """Создание временной таблицы"""
-        table_name = f'stg_{file_path[len(self.config["paths"]["files_dir"]) + 1:file_path.rfind(".") - 9]}_temp'
-        data_frame.to_sql(
-            table_name, self.engine, if_exists='replace', 
-            index=False, schema='bank'
+    def _run_fraud_report(self, date_str, suffix):
+        """Этап построения витрины мошенничества (с метаданными)"""
+        inputs = self._stage_inputs(
+            date_str, ['transactions', 'passport_blacklist', 'terminals']
         )
-        logging.info(f"Временная таблица '{table_name}' создана/перезаписана")
-        logging.info(f"Загружено {len(data_frame)} записей")
-        return len(data_frame)
+        if self._resumed(date_str, 'build_fraud_report', inputs):
+            logging.info("Витрина за дату уже построена, пропускаю")
+            return
+        with self.engine.connect() as conn:
+            self._build_fraud_report(conn, date_str, suffix)
+            self._upsert_last_update(date_str, 'rep_fraud', 'report')
+            self.meta.flush(
+                conn, date_str, file_types=[], tables=['rep_fraud']
+            )
+            self._save_checkpoint(
+                date_str, 'build_fraud_report', inputs, conn=conn
+            )
+            conn.commit()
+
+    def _run_archive(self, date_str, files):
+        """Этап архивирования файлов с контрольной точкой завершения даты"""
+        archived = self._archive_files(date_str, files)
+        self._save_checkpoint(
+            date_str, 'archive_files',
+            self._stage_inputs(
+                date_str, ['transactions', 'passport_blacklist', 'terminals']
+            ),
+            archived
+        )
+        return archived
+
+    def _flush_meta(self, date_str):
+        """Запись оставшихся в буфере метаданных даты"""
+        try:
+            with self.engine.connect() as conn:
+                self.meta.flush(conn, date_str)
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка при записи метаданных: {str(e)}")
+
+    def _flush_metrics(self, date_str):
+        """Запись метрик этапов в bank.meta_stage_metrics и файл метрик"""
+        records = self.metrics.pop_records(date_str)
+        if not records:
+            return
+
+        try:
+            load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+            with self.engine.connect() as conn:
+                conn.execute(text(
+                    """
+                    INSERT INTO bank.meta_stage_metrics(
+                        run_id, load_date, stage_name, statement_index, status,
+                        duration_sec, rows_processed, rows_per_sec,
+                        process_peak_rss_mb, started_at, details
+                    ) VALUES (
+                        :run_id, :load_date, :stage, :statement_index, :status,
+                        :duration_sec, :rows, :rows_per_sec,
+                        :process_peak_rss_mb, :started_at, :details
+                    )
+                    """
+                ), [{**r, 'load_date': load_date} for r in records])
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка при записи метрик в БД: {str(e)}")
+
+        metrics_config = self.config.get('metrics', {})
+        metrics_dir = metrics_config.get('dir', 'logs')
+        try:
+            if metrics_config.get('format', 'json') == 'prometheus':
+                self.metrics.write_prometheus(
+                    records, os.path.join(metrics_dir, 'etl_metrics.prom')
+                )
+            else:
+                self.metrics.write_json(
+                    records,
+                    os.path.join(
+                        metrics_dir, f"metrics_{self.metrics.run_id}.jsonl"
+                    )
+                )
+        except Exception as e:
+            logging.error(f"Ошибка при записи файла метрик: {str(e)}")
+
+    def _log_meta_errors(self, date_str, files, error):
+        """Пишем неуспешные загрузки по известным файлам"""
+        try:
+            if files.get('transactions'):
+                self._log_meta_load(date_str, 'transactions', files['transactions'], 0, 'ERROR', str(error))
+            if files.get('blacklist'):
+                self._log_meta_load(date_str, 'passport_blacklist', files['blacklist'], 0, 'ERROR', str(error))
+            if files.get('terminals'):
+                self._log_meta_load(date_str, 'terminals', files['terminals'], 0, 'ERROR', str(error))
+            self._flush_meta(date_str)
+        except Exception:
+            pass
+
+    def _create_stage_tables(self, suffix):
+        """Создание staging-таблиц отдельной даты по образцу *_temp"""
+        with raw_connection(self.engine) as conn:
+            cursor = conn.cursor()
+            for table in STAGING_TABLES:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS bank.{table}_{suffix} "
+                    f"(LIKE bank.{table}_temp INCLUDING ALL)"
+                )
+
+    def _drop_stage_tables(self, suffix):
+        """Удаление staging-таблиц отдельной даты"""
+        with raw_connection(self.engine) as conn:
+            cursor = conn.cursor()
+            for table in STAGING_TABLES:
+                cursor.execute(f"DROP TABLE IF EXISTS bank.{table}_{suffix}")
 
-    def _process_transactions(self, file_path):
-        """Обработка файла транзакций"""
+    def _staging_mode(self):
+        """Режим загрузки staging: 'copy' (по умолчанию) или 'to_sql'"""
+        return self.config.get('staging', {}).get('mode', 'copy')
+
+    def _staging_table_name(self, file_path, suffix='temp'):
+        """Имя staging-таблицы по имени файла (без даты и расширения)"""
+        file_name = os.path.basename(file_path)
+        return f'stg_{file_name[:file_name.rfind(".") - 9]}_{suffix}'
+
+    def _chunk_size(self):
+        """Размер чанка при потоковом чтении транзакций"""
+        return int(self.config.get('staging', {}).get('chunk_size', 100000))
+
+    def _create_temp_table(self, data_frame, file_path, suffix='temp'):
+        """Загрузка DataFrame во временную таблицу"""
+        return self._stage_chunks([data_frame], file_path, suffix)
+
+    def _stage_chunks(self, chunks, file_path, suffix='temp'):
+        """
+        Последовательная загрузка чанков во временную таблицу
+
+        Таблица очищается и загружается в одной транзакции: COPY
+        (staging.mode = copy) или pandas.to_sql с дозаписью
+        в созданную миграциями таблицу (staging.mode = to_sql)
+        """
+        table_name = self._staging_table_name(file_path, suffix)
+        mode = 'to_sql' if self._staging_mode() == 'to_sql' else 'copy'
+        total = 0
+        read_time = 0.0
+        write_time = 0.0
+
+        if mode == 'to_sql':
+            with self.engine.begin() as conn:
+                conn.execute(text(f"TRUNCATE TABLE bank.{table_name}"))
+                chunks = iter(chunks)
+                while True:
+                    started = time.perf_counter()
+                    chunk = next(chunks, None)
+                    read_time += time.perf_counter() - started
+                    if chunk is None:
+                        break
+
+                    started = time.perf_counter()
+                    chunk.to_sql(
+                        table_name, conn, if_exists='append',
+                        index=False, schema='bank'
+                    )
+                    total += len(chunk)
+                    write_time += time.perf_counter() - started
+        else:
+            with raw_connection(self.engine) as conn:
+                truncate_table(conn, f'bank.{table_name}')
+                chunks = iter(chunks)
+                while True:
+                    # Чтение и разбор очередного чанка
+                    started = time.perf_counter()
+                    chunk = next(chunks, None)
+                    read_time += time.perf_counter() - started
+                    if chunk is None:
+                        break
+
+                    started = time.perf_counter()
+                    buffer = io.StringIO()
+                    chunk.to_csv(buffer, sep=';', header=False, index=False)
+                    buffer.seek(0)
+                    total += copy_to_table(
+                        conn, f'bank.{table_name}', buffer,
+                        list(chunk.columns)
+                    )
+                    write_time += time.perf_counter() - started
+
+        date_str = self._file_date(file_path)
+        self.metrics.record(
+            date_str, f"read_file:{table_name}", read_time, total
+        )
+        self.metrics.record(
+            date_str, f"{mode}:{table_name}", write_time, total
+        )
+        logging.info(f"Временная таблица '{table_name}' очищена и загружена")
+        logging.info(f"Загружено {total} записей")
+        return total
+
+    def _file_date(self, file_path):
+        """Дата загрузки - последние 8 символов имени файла (DDMMYYYY)"""
+        file_name = os.path.basename(file_path)
+        return file_name[file_name.rfind(".") - 8:file_name.rfind(".")]
+
+    def _quarantine(self, file_path):
+        """Файл карантина отклоненных строк исходного файла"""
+        settings = self.config.get('quality', {})
+        return Quarantine(
+            settings.get('quarantine_dir', 'quarantine'), file_path,
+            float(settings.get('max_reject_share', 0.1))
+        )
+
+    def _finish_quarantine(self, quarantine):
+        """Проверка доли отклоненных строк и запись итога в лог"""
+        if quarantine.rejected:
+            logging.warning(
+                f"Файл {quarantine.file_path}: отклонено "
+                f"{quarantine.rejected} из {quarantine.checked} строк, "
+                f"причины в {quarantine.path}"
+            )
+        quarantine.verify()
+
+    def _known_terminals(self, file_path):
+        """
+        Идентификаторы терминалов для проверки ссылок транзакций
+
+        Терминалы измерения и снимка той же даты, если он уже получен;
+        None - проверка отключена (quality.check_terminals)
+        """
+        if not self.config.get('quality', {}).get('check_terminals', True):
+            return None
+
+        with self.engine.connect() as conn:
+            known = conn.execute(text(
+                "SELECT DISTINCT terminal_id FROM bank.dwh_dim_terminals_hist"
+            )).scalars().all()
+
+        snapshot = os.path.join(
+            os.path.dirname(file_path),
+            f"terminals_{self._file_date(file_path)}.xlsx"
+        )
+        if snapshot in self.replay_sources or os.path.exists(snapshot):
+            try:
+                terminals = self._read_xlsx(snapshot)
+                known += terminals['terminal_id'].dropna().tolist()
+            except Exception as e:
+                logging.warning(
+                    f"Снимок {snapshot} не прочитан для проверки ссылок "
+                    f"на терминалы: {str(e)}"
+                )
+        return pd.Index(known).unique()
+
+    def _process_transactions(self, file_path, suffix='temp'):
+        """
+        Обработка файла транзакций (потоковое чтение по чанкам)
+
+        Каждый чанк проходит проверку качества: отклоненные строки
+        пишутся в карантин, остальные загружаются в staging.
+        Возвращает (загружено, отклонено)
+        """
         logging.info(f"Обработка транзакций из файла: {file_path}")
 
-        df = load_file_to_df(file_path, "txt")
-        return self._create_temp_table(df, file_path)
+        date_str = self._file_date(file_path)
+        load_date = pd.Timestamp(
+            f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
+        )
+        terminals = self._known_terminals(file_path)
+        quarantine = self._quarantine(file_path)
+
+        def checked_chunks():
+            for chunk in self._read_chunks(file_path):
+                clean, rejected = check_transactions(
+                    validate_columns(chunk, TRANSACTIONS_COLUMNS, file_path),
+                    load_date, terminals
+                )
+                quarantine.write(rejected, len(chunk))
+                yield clean
+            # Ошибка до фиксации COPY откатывает загрузку staging
+            self._finish_quarantine(quarantine)
 
-    def _process_blacklist(self, file_path):
+        count = self._stage_chunks(checked_chunks(), file_path, suffix)
+        return count, quarantine.rejected
+
+    def _process_blacklist(self, file_path, suffix='temp'):
         """Обработка файла черного списка паспортов"""
         logging.info(f"Обработка черного списка из файла: {file_path}")
 
-        df = load_file_to_df(file_path, "xlsx")
-        return self._create_temp_table(df, file_path)
+        df = validate_columns(
+            self._read_xlsx(file_path), BLACKLIST_COLUMNS, file_path
+        )
+        return self._stage_checked(df, check_blacklist, file_path, suffix)
 
-    def _process_terminals(self, file_path):
+    def _process_terminals(self, file_path, suffix='temp'):
         """Обработка файла терминалов"""
         logging.info(f"Обработка терминалов из файла: {file_path}")
 
-        df = load_file_to_df(file_path, "xlsx")
-        return self._create_temp_table(df, file_path)
+        df = validate_columns(
+            self._read_xlsx(file_path), TERMINALS_COLUMNS, file_path
+        )
+        return self._stage_checked(df, check_terminals, file_path, suffix)
+
+    def _stage_checked(self, data_frame, check, file_path, suffix='temp'):
+        """
+        Проверка качества и загрузка файла-справочника в staging
+
+        Возвращает (загружено, отклонено)
+        """
+        quarantine = self._quarantine(file_path)
+        clean, rejected = check(data_frame)
+        quarantine.write(rejected, len(data_frame))
+        self._finish_quarantine(quarantine)
+        count = self._create_temp_table(clean, file_path, suffix)
+        return count, quarantine.rejected
+
+    def _log_meta_load(self, date_str, file_type, file_name, records_loaded, status, error_message=None, records_rejected=0):
+        """Запись в bank.meta_load_info (через буфер метаданных)"""
+        self.meta.log_load(
+            date_str, file_type, file_name, records_loaded, status,
+            error_message, records_rejected
+        )
+
+    def _upsert_last_update(self, date_str, table_name, update_type):
+        """Апсерт bank.meta_last_update по имени таблицы (через буфер)"""
+        self.meta.touch(date_str, table_name, update_type)
+
+    def _maintain_partitions(self, date_str):
+        """
+        Создание секций фактов и витрины заранее и отсоединение устаревших
+
+        Секции создаются помесячно от предыдущего дня (перенос операций
+        через полночь) до partitioning.ahead_months месяцев вперед.
+        Секции старше partitioning.retention_months месяцев отсоединяются
+        и остаются отдельными таблицами для архивирования.
+        """
+        settings = self.config.get('partitioning', {})
+        params = {
+            'load_date': f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}",
+            'ahead': int(settings.get('ahead_months', 1)),
+            'retention': int(settings.get('retention_months', 0)),
+        }
+        detached = []
 
-    def _log_meta_load(self, date_str, file_type, file_name, records_loaded, status, error_message=None):
-        """Запись в bank.meta_load_info"""
-        load_date = f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}"
         with self.engine.connect() as conn:
-            conn.execute(text(
-                """
-                INSERT INTO bank.meta_load_info(
-                    load_date, file_type, file_name, records_loaded, load_status, error_message
-                ) VALUES (:load_date, :file_type, :file_name, :records_loaded, :load_status, :error_message)
-                """
-            ), {
-                'load_date': load_date,
-                'file_type': file_type,
-                'file_name': os.path.basename(file_name) if file_name else None,
-                'records_loaded': int(records_loaded) if records_loaded is not None else 0,
-                'load_status': status,
-                'error_message': error_message
-            })
+            for table in PARTITIONED_TABLES:
+                conn.execute(text(
+                    """
+                    SELECT bank.ensure_partitions(
+                        :table,
+                        CAST(:load_date AS DATE) - 1,
+                        (CAST(:load_date AS DATE)
+                            + make_interval(months => :ahead))::DATE
+                    )
+                    """
+                ), {**params, 'table': table})
+
+                if params['retention'] > 0:
+                    detached += conn.execute(text(
+                        """
+                        SELECT bank.detach_partitions_before(
+                            :table,
+                            (date_trunc('month', CAST(:load_date AS DATE))
+                                - make_interval(months => :retention))::DATE
+                        )
+                        """
+                    ), {**params, 'table': table}).scalars().all()
+
+            # Отсоединение секций витрины меняет ее содержимое
+            # (отметка пишется сразу: буфер даты сбрасывают другие этапы)
+            if any(name.startswith('rep_fraud') for name in detached):
+                conn.execute(text(
+                    """
+                    INSERT INTO bank.meta_last_update(
+                        table_name, last_update_date, last_update_type
+                    )
+                    VALUES ('rep_fraud', CURRENT_TIMESTAMP, 'retention')
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        last_update_date = EXCLUDED.last_update_date,
+                        last_update_type = EXCLUDED.last_update_type
+                    """
+                ))
             conn.commit()
 
-    def _upsert_last_update(self, table_name, update_type):
-        """Апсерт bank.meta_last_update по имени таблицы"""
+        if detached:
+            logging.info(
+                f"Отсоединены устаревшие секции: {', '.join(detached)}"
+            )
+        return len(detached)
+
+    def _refresh_enrichment(self, date_str):
+        """
+        Обновление bank.dwh_card_enrichment
+
+        Выполняется, только если cards, accounts или clients менялись
+        после предыдущего обновления (версии ведут триггеры, см. V004)
+        """
         with self.engine.connect() as conn:
-            conn.execute(text(
-                """
-                INSERT INTO bank.meta_last_update(table_name, last_update_date, last_update_type)
-                VALUES (:t, CURRENT_TIMESTAMP, :tp)
-                ON CONFLICT (table_name) DO UPDATE SET
-                    last_update_date = EXCLUDED.last_update_date,
-                    last_update_type = EXCLUDED.last_update_type
-                """
-            ), {'t': table_name, 'tp': update_type})
+            state = {
+                row.table_name: row
+                for row in conn.execute(text(
+                    """
+                    SELECT table_name, version, refreshed_version
+                    FROM bank.meta_source_state
+                    WHERE table_name = ANY(:tables)
+                    """
+                ), {'tables': ENRICHMENT_SOURCES})
+            }
+
+            # Таблицы, созданные после миграции, подключаем к отслеживанию
+            for table in ENRICHMENT_SOURCES:
+                if table not in state:
+                    conn.execute(
+                        text("SELECT bank.track_source_table(:table)"),
+                        {'table': table}
+                    )
+
+            if len(state) == len(ENRICHMENT_SOURCES) and all(
+                row.version == row.refreshed_version
+                for row in state.values()
+            ):
+                conn.commit()
+                logging.info("Справочники не менялись, обогащение актуально")
+                return 0
+
+            logging.info("Обновляю обогащение карт")
+            sql_script = os.path.join(
+                self.config['paths']['dml_sql'], 'refresh_enrichment.sql'
+            )
+            with open(sql_script, 'r', encoding='utf-8') as f:
+                execute_statements(
+                    conn, f.read(),
+                    on_statement=self.metrics.statement_callback(
+                        date_str, 'refresh_enrichment'
+                    )
+                )
+
+            # Фиксируем версии, прочитанные до обновления: изменения,
+            # сделанные во время обновления, будут учтены в следующий раз
+            for table, row in state.items():
+                conn.execute(text(
+                    """
+                    UPDATE bank.meta_source_state
+                    SET refreshed_version = :version
+                    WHERE table_name = :table
+                    """
+                ), {'table': table, 'version': row.version})
             conn.commit()
+        return len(state)
+
+    def _load_dimensions(self, conn, date_str, files, suffix='temp'):
+        """
+        Загрузка измерений SCD2 по общему шаблону в транзакции conn
 
-    def _load_dimensions(self, date_str):
-        """Загрузка измерений с использованием SCD2"""
+        Измерение загружается, только если за дату получен его файл-снимок;
+        возвращает список загруженных таблиц. Фиксирует вызывающий
+        """
         logging.info("Начинаю загрузку измерений")
 
-        # Загрузка терминалов (SCD2)
         sql_script = os.path.join(
             self.config['paths']['dml_sql'], 'load_dimensions.sql'
         )
-        if os.path.exists(sql_script):
-            with self.engine.connect() as conn:
-                with open(sql_script, 'r', encoding='utf-8') as f:
-                    sql = f.read()
-                    conn.execute(
-                        text(sql),
-                        {"date_str":
-                            f"{date_str[-4:]}-{date_str[2:4]}-{date_str[:2]}"})
-                    conn.commit()
+        with open(sql_script, 'r', encoding='utf-8') as f:
+            template = f.read()
+
+        loaded = []
+        for dimension in DIMENSIONS:
+            if dimension.file_type and not files.get(dimension.file_type):
+                logging.info(
+                    f"Нет снимка для {dimension.table}, пропускаю"
+                )
+                continue
+            # Шаблон - одна команда: выполняется целиком, без разбиения
+            started = time.perf_counter()
+            result = conn.execute(
+                text(build_scd2_sql(template, dimension, suffix)),
+                {"date_str":
+                    f"{date_str[-4:]}-{date_str[2:4]}-{date_str[:2]}"}
+            )
+            self.metrics.record(
+                date_str, f'load_dimensions:{dimension.table}',
+                time.perf_counter() - started, result.rowcount
+            )
+            loaded.append(dimension.table)
 
         logging.info("Загрузка измерений завершена")
+        return loaded
 
-    def _load_facts(self, date_str):
-        """Загрузка фактовых таблиц"""
+    def _load_facts(self, conn, date_str, suffix='temp'):
+        """Загрузка фактовых таблиц в транзакции conn (фиксирует вызывающий)"""
         logging.info("Начинаю загрузку фактов")
 
         sql_script = os.path.join(
             self.config['paths']['dml_sql'], 'load_facts.sql'
         )
         if os.path.exists(sql_script):
-            with self.engine.connect() as conn:
-                with open(sql_script, 'r', encoding='utf-8') as f:
-                    sql = f.read()
-                    conn.execute(
-                        text(sql),
-                        {"date_str":
-                            f"{date_str[-4:]}-{date_str[2:4]}-{date_str[:2]}"})
-                    conn.commit()
+            with open(sql_script, 'r', encoding='utf-8') as f:
+                sql = f.read().format(stg_suffix=suffix)
+            execute_statements(
+                conn, sql,
+                {"date_str":
+                    f"{date_str[-4:]}-{date_str[2:4]}-{date_str[:2]}"},
+                on_statement=self.metrics.statement_callback(
+                    date_str, 'load_facts'
+                )
+            )
 
         logging.info("Загрузка фактов завершена")
 
-    def _build_fraud_report(self):
-        """Построение витрины мошенничества"""
-        logging.info("Начинаю построение витрины мошенничества")
+    def _build_fraud_report(self, conn, date_str, suffix='temp'):
+        """
+        Построение витрины мошенничества за один проход по всем правилам
+
+        События вставляются в транзакции conn, фиксирует вызывающий
+        """
+        logging.info(
+            f"Начинаю построение витрины мошенничества "
+            f"({len(FRAUD_RULES)} правил)"
+        )
 
+        started = time.perf_counter()
+        if self._fraud_backend() == 'pandas':
+            inserted = self._build_fraud_report_pandas(conn, date_str, suffix)
+        else:
+            inserted = self._build_fraud_report_sql(conn, date_str, suffix)
+        elapsed = time.perf_counter() - started
+
+        # Правила вычисляются одним проходом: время общее,
+        # количество новых событий - по каждому правилу
+        counts = Counter(inserted)
+        for rule in FRAUD_RULES:
+            self.metrics.record(
+                date_str, f"fraud_rule:{rule.event_type}", elapsed,
+                counts.get(rule.event_type, 0)
+            )
+        logging.info(f"Новых событий в витрине: {len(inserted)}")
+
+        logging.info("Витрина мошенничества построена")
+
+    def _fraud_backend(self):
+        """Способ расчета витрины: 'sql' (по умолчанию) или 'pandas'"""
+        return self.config.get('fraud', {}).get('backend', 'sql')
+
+    def _fraud_shards(self):
+        """Число сегментов карт для параллельного расчета витрины"""
+        return max(1, int(self.config.get('fraud', {}).get('shards', 1)))
+
+    def _build_fraud_report_sql(self, conn, date_str, suffix):
+        """
+        Расчет витрины в БД; возвращает типы вставленных событий
+
+        При fraud.shards > 1 события сегментов карт вычисляются
+        параллельно в отдельных соединениях пула и вставляются
+        одной командой в транзакции conn
+        """
         sql_script = os.path.join(
             self.config['paths']['dml_sql'], 'build_fraud_report.sql'
         )
-        if os.path.exists(sql_script):
-            with self.engine.connect() as conn:
-                with open(sql_script, 'r', encoding='utf-8') as f:
-                    sql = f.read()
-                    conn.execute(text(sql))
-                    conn.commit()
+        with open(sql_script, 'r', encoding='utf-8') as f:
+            template = f.read()
 
-        logging.info("Витрина мошенничества построена")
+        shards = self._fraud_shards()
+        if shards == 1:
+            sql = build_fraud_report_sql(
+                template, FRAUD_RULES, stg_suffix=suffix
+            )
+            inserted = conn.execute(text(sql)).fetchall()
+            return [row.event_type for row in inserted]
+
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            parts = pool.map(
+                partial(self._select_fraud_events, date_str, shards),
+                range(shards),
+                [
+                    build_fraud_events_sql(
+                        template, FRAUD_RULES, suffix, shard, shards
+                    )
+                    for shard in range(shards)
+                ]
+            )
+            events = [row for part in parts for row in part]
+        return self._insert_fraud_events(conn, events)
 
-    def _archive_files(self, files):
-        """Архивирование обработанных файлов"""
+    def _select_fraud_events(self, date_str, shards, shard, sql):
+        """События одного сегмента карт (отдельное соединение пула)"""
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            events = [tuple(row) for row in conn.execute(text(sql))]
+        self.metrics.record(
+            date_str, f"fraud_shard:{shard + 1}/{shards}",
+            time.perf_counter() - started, len(events)
+        )
+        return events
+
+    def _insert_fraud_events(self, conn, events):
+        """
+        Вставка событий в rep_fraud в транзакции conn
+
+        Повторные события (в том числе одинаковые события разных карт
+        одного клиента) пропускаются; возвращает типы вставленных событий
+        """
+        if not events:
+            return []
+        # Вставка через курсор psycopg2 той же транзакции
+        inserted = execute_values(
+            conn.connection.cursor(),
+            """
+            INSERT INTO bank.rep_fraud (
+                event_dt, passport, fio, phone, event_type
+            ) VALUES %s
+            ON CONFLICT (event_dt, passport, event_type) DO NOTHING
+            RETURNING event_type
+            """,
+            events,
+            fetch=True
+        )
+        return [row[0] for row in inserted]
+
+    def _fraud_workers(self, rows):
+        """
+        Число процессов расчета витрины в памяти
+
+        Не больше fraud.shards и ядер процессора и не меньше
+        fraud.min_shard_rows новых транзакций на процесс: запуск процесса
+        дороже расчета малого дня
+        """
+        min_rows = int(
+            self.config.get('fraud', {}).get('min_shard_rows', 50000)
+        )
+        return max(1, min(
+            self._fraud_shards(), os.cpu_count() or 1,
+            rows // max(min_rows, 1)
+        ))
+
+    def _build_fraud_report_pandas(self, conn, date_str, suffix):
+        """
+        Расчет витрины в памяти процесса (py_scripts/fraud_engine.py)
+
+        Из БД читаются staging транзакций, хвост истории карт, версии
+        терминалов, обогащение карт и черный список; события вставляются
+        в rep_fraud. Возвращает типы вставленных событий
+        """
+        history_sql = os.path.join(
+            self.config['paths']['dml_sql'], 'fraud_history.sql'
+        )
+        with open(history_sql, 'r', encoding='utf-8') as f:
+            history_sql = f.read().format(
+                stg_suffix=suffix,
+                history_depth=max(r.lookback for r in FRAUD_RULES),
+                history_minutes=max(r.lookback_minutes for r in FRAUD_RULES)
+            )
+
+        new = pd.read_sql(text(
+            f"SELECT {', '.join(fraud_engine.TRANSACTION_COLUMNS)} "
+            f"FROM bank.stg_transactions_{suffix}"
+        ), conn)
+        history = pd.read_sql(text(history_sql), conn)
+        terminals = pd.read_sql(text(
+            """
+            SELECT terminal_id, terminal_city, effective_from,
+                   effective_to, deleted_flg
+            FROM bank.dwh_dim_terminals_hist
+            """
+        ), conn)
+        enrichment = pd.read_sql(text(
+            f"""
+            SELECT card_num, account_valid_to, passport_num, fio, phone,
+                   passport_valid_to, date_of_birth
+            FROM bank.dwh_card_enrichment
+            WHERE card_num IN (
+                SELECT card_num FROM bank.stg_transactions_{suffix}
+            )
+            """
+        ), conn)
+        blacklist = pd.read_sql(text(
+            """
+            SELECT passport, MIN(entry_dt) AS entry_dt
+            FROM bank.dwh_fact_passport_blacklist
+            GROUP BY passport
+            """
+        ), conn)
+
+        workers = self._fraud_workers(len(new))
+        started = time.perf_counter()
+        events = fraud_engine.evaluate_sharded(
+            new, history, terminals, enrichment,
+            fraud_engine.blacklist_entries(blacklist), workers
+        )
+        self.metrics.record(
+            date_str, f"fraud_evaluate:{workers}",
+            time.perf_counter() - started, len(new)
+        )
+
+        events = events.astype(object).where(events.notna(), None)
+        return self._insert_fraud_events(
+            conn, list(events.itertuples(index=False, name=None))
+        )
+
+    def _archive_files(self, date_str, files):
+        """
+        Архивирование обработанных файлов в сжатый архив с индексом
+
+        Файлы, загруженные из архива (replay), уже заархивированы
+        """
         logging.info("Начинаю архивирование файлов")
 
-        archive_dir = self.config['paths']['archive_dir']
+        fingerprints = self.file_fingerprints.get(date_str, {})
+        archived = 0
 
-        for file_type, file_path in files.items():
-            if file_path and os.path.exists(file_path):
+        for file_type, meta_type, _ in self._staging_handlers():
+            file_path = files.get(file_type)
+            if (file_path and file_path not in self.replay_sources
+                    and os.path.exists(file_path)):
                 try:
-                    archived_path = archive_file(file_path, archive_dir)
+                    fingerprint = fingerprints.get(meta_type)
+                    entry = self.archive.store(
+                        file_path, date_str, meta_type,
+                        fingerprint and fingerprint['content_hash']
+                    )
+                    archived += 1
                     logging.info(
-                        f"Файл {file_path} перемещен в архив: {archived_path}"
+                        f"Файл {file_path} перемещен в архив: "
+                        f"{entry['archive_name']} ({entry['file_size']} -> "
+                        f"{entry['archive_size']} байт)"
                     )
                 except Exception as e:
                     logging.error(
                         f"Ошибка при архивировании файла {file_path}: "
                         f"{str(e)}"
                     )
+        return archived
 
-    def get_fraud_report(self, date_str=None):
-        """Получение отчета по мошенничеству"""
-        query = "SELECT * FROM bank.rep_fraud"
-        if date_str:
-            date_condition = (
-                f" WHERE DATE(event_dt) = "
-                f"'{date_str[:2]}-{date_str[2:4]}-{date_str[4:]}'"
+    def get_fraud_report(self, date_str=None, date_to=None, event_types=None,
+                         passports=None):
+        """
+        Получение отчета по мошенничеству за дату или период
+
+        Все фильтры передаются в запрос связанными параметрами. Результат
+        кэшируется до изменения отметки витрины в meta_last_update
+        """
+        filters = {
+            'date_from': date_str, 'date_to': date_to,
+            'event_types': event_types, 'passports': passports,
+        }
+        return self._cached_report(
+            'report', build_report_query, fetch_report, filters
+        )
+
+    def get_fraud_summary(self, date_str=None, date_to=None,
+                          event_types=None, passports=None):
+        """Число событий по типам за дату или период (с кэшем, как отчет)"""
+        filters = {
+            'date_from': date_str, 'date_to': date_to,
+            'event_types': event_types, 'passports': passports,
+        }
+        return self._cached_report(
+            'summary', build_summary_query, fetch_summary, filters
+        )
+
+    def _cached_report(self, kind, build_query, fetch, filters):
+        """Результат запроса к витрине из кэша или из БД"""
+        key = cache_key(kind, *build_query(**filters))
+        with raw_connection(self.engine) as conn:
+            version = report_version(conn)
+            return self.report_cache.get_or_load(
+                key, version, partial(fetch, conn, **filters)
             )
-            query += date_condition
-        query += " ORDER BY event_dt DESC"
 
-        df = pd.read_sql(query, self.engine)
-        return df
+    def export_fraud_report(self, path, date_from=None, date_to=None,
+                            event_types=None, passports=None, fmt=None):
+        """Потоковая выгрузка отчета в CSV или Parquet"""
+        fetch_size = self.config.get('report', {}).get('fetch_size', 50000)
+        with raw_connection(self.engine) as conn:
+            return export_report(
+                conn, path, fmt=fmt, fetch_size=fetch_size,
+                date_from=date_from, date_to=date_to,
+                event_types=event_types, passports=passports
+            )
@@ -0,0 +1,129 @@
+"""
+Индекс отпечатков загруженных файлов (bank.meta_file_fingerprint)
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+# Файлы-снимки справочников: пропускаются, только если совпадают
+# с последним загруженным снимком, а не с любым из прежних
+SNAPSHOT_FILE_TYPES = {'terminals'}
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path, block_size=HASH_BLOCK_SIZE):
+    """SHA-256 содержимого файла, читается блоками"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileIndex:
+    """Поиск и регистрация отпечатков загруженных файлов"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.logger = logging.getLogger(__name__)
+
+    def fingerprint(self, file_path):
+        """
+        Отпечаток файла: размер, время изменения и хэш содержимого
+
+        Если файл с тем же именем, размером и временем изменения уже
+        регистрировался, хэш берется из индекса без чтения файла
+        """
+        stat = os.stat(file_path)
+        fingerprint = {
+            'file_name': os.path.basename(file_path),
+            'file_size': stat.st_size,
+            'file_mtime': datetime.fromtimestamp(stat.st_mtime),
+        }
+
+        with self.engine.connect() as conn:
+            known_hash = conn.execute(text(
+                """
+                SELECT content_hash
+                FROM bank.meta_file_fingerprint
+                WHERE file_name = :file_name
+                  AND file_size = :file_size
+                  AND file_mtime = :file_mtime
+                LIMIT 1
+                """
+            ), fingerprint).scalar()
+
+        fingerprint['content_hash'] = known_hash or file_hash(file_path)
+        return fingerprint
+
+    def find_loaded(self, file_type, fingerprint, load_date):
+        """
+        Загрузка с тем же содержимым или None
+
+        Файлы транзакций и черного списка считаются повторной доставкой,
+        только если то же содержимое уже загружалось за ту же дату:
+        совпадающий файл новой даты (например, пустой или неизменный
+        черный список) загружается. Для снимков справочников сравнение идет только с последним
+        снимком до даты загрузки: снимок, совпадающий с более старым,
+        означает откат изменений и должен быть загружен
+        """
+        params = {
+            'file_type': file_type,
+            'content_hash': fingerprint['content_hash'],
+            'load_date': load_date,
+        }
+        if file_type in SNAPSHOT_FILE_TYPES:
+            query = """
+                SELECT load_date, file_name, content_hash
+                FROM bank.meta_file_fingerprint
+                WHERE file_type = :file_type AND load_date < :load_date
+                ORDER BY load_date DESC, fingerprint_id DESC
+                LIMIT 1
+            """
+        else:
+            query = """
+                SELECT load_date, file_name, content_hash
+                FROM bank.meta_file_fingerprint
+                WHERE file_type = :file_type
+                  AND content_hash = :content_hash
+                  AND load_date = :load_date
+                ORDER BY fingerprint_id DESC
+                LIMIT 1
+            """
+
+        with self.engine.connect() as conn:
+            row = conn.execute(text(query), params).first()
+        if row is None or row.content_hash != fingerprint['content_hash']:
+            return None
+        return row
+
+    def register(self, load_date, fingerprints):
+        """
+        Регистрация отпечатков успешно загруженных файлов даты
+
+        fingerprints - словарь тип файла -> отпечаток; пишется
+        одним пакетом в одной транзакции
+        """
+        if not fingerprints:
+            return
+        with self.engine.connect() as conn:
+            conn.execute(text(
+                """
+                INSERT INTO bank.meta_file_fingerprint(
+                    load_date, file_type, file_name, file_size,
+                    file_mtime, content_hash
+                ) VALUES (
+                    :load_date, :file_type, :file_name, :file_size,
+                    :file_mtime, :content_hash
+                )
+                """
+            ), [
+                {**fingerprint, 'load_date': load_date, 'file_type': file_type}
+                for file_type, fingerprint in fingerprints.items()
+            ])
+            conn.commit()
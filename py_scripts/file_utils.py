@@ -1,7 +1,13 @@
 import os
-import shutil
 import pandas as pd
 import re
+from datetime import datetime, timedelta
+
+
+TRANSACTIONS_COLUMNS = [
+    'transaction_id', 'transaction_date', 'amount', 'card_num',
+    'oper_type', 'oper_result', 'terminal'
+]
 
 
 def get_files_by_date(files_dir, date_str) -> dict:
@@ -27,33 +33,45 @@ def get_files_by_date(files_dir, date_str) -> dict:
     return files
 
 
-def load_file_to_df(file_path, file_type) -> pd.DataFrame:
-    """Загружает файл в DataFrame"""
+def load_file_to_df(file_path, file_type, cache=None) -> pd.DataFrame:
+    """
+    Загружает файл в DataFrame
+
+    xlsx при переданном кэше (IngestCache) разбирается один раз
+    """
     if file_type == "txt":
         return pd.read_csv(file_path, sep=';', dtype=str)
     elif file_type == "xlsx":
+        if cache is not None:
+            return cache.get_or_load(
+                file_path, lambda: pd.read_excel(file_path, dtype=str)
+            )
         return pd.read_excel(file_path, dtype=str)
     else:
         raise ValueError(f"Неизвестный тип файла: {file_type}")
 
 
-def archive_file(src_path, archive_dir) -> str:
-    """Перемещает файл в архив с расширением .backup"""
-    if not os.path.exists(src_path):
-        raise FileNotFoundError(f"Файл для архивирования не найден: {src_path}")
-    
-    # Создаем директорию архива если её нет
-    os.makedirs(archive_dir, exist_ok=True)
-    
-    filename = os.path.basename(src_path)
-    dst_path = os.path.join(archive_dir, f"{filename}.backup")
-    
-    # Проверяем, не существует ли уже файл с таким именем
-    if os.path.exists(dst_path):
-        os.remove(dst_path)
-    
-    shutil.move(src_path, dst_path)
-    return dst_path
+def iter_file_chunks(file_path, chunk_size):
+    """
+    Потоково читает txt-файл чанками по chunk_size строк
+
+    Память ограничена размером одного чанка независимо от размера файла
+    """
+    with pd.read_csv(
+        file_path, sep=';', dtype=str, chunksize=chunk_size
+    ) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def validate_columns(data_frame, expected_columns, file_path):
+    """Проверяет, что в DataFrame присутствуют ожидаемые колонки"""
+    missing = [c for c in expected_columns if c not in data_frame.columns]
+    if missing:
+        raise ValueError(
+            f"В файле {file_path} отсутствуют колонки: {', '.join(missing)}"
+        )
+    return data_frame[expected_columns]
 
 
 def normalize_date(date_str: str) -> str:
@@ -107,3 +125,21 @@ def normalize_date(date_str: str) -> str:
     
     raise ValueError(f"Неподдерживаемый формат даты: {date_str}. "
                     f"Используйте DD-MM-YYYY, DD.MM.YYYY, DD/MM/YYYY или DDMMYYYY")
+
+
+def date_range(start_date, end_date) -> list:
+    """
+    Возвращает список дат в формате DDMMYYYY от start_date до end_date
+    включительно
+    """
+    start = datetime.strptime(normalize_date(start_date), '%d%m%Y')
+    end = datetime.strptime(normalize_date(end_date), '%d%m%Y')
+    if start > end:
+        raise ValueError(
+            f"Начальная дата {start_date} позже конечной {end_date}"
+        )
+
+    days = (end - start).days + 1
+    return [
+        (start + timedelta(days=i)).strftime('%d%m%Y') for i in range(days)
+    ]
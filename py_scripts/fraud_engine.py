@@ -0,0 +1,442 @@
+"""
+Расчет витрины мошенничества в памяти процесса (pandas/NumPy)
+
+Повторяет build_fraud_report.sql без обращения к БД: поток транзакций
+(новые + хвост истории карт), город терминала по версиям SCD2,
+оконные признаки по карте, обогащение карт и черный список.
+Каждое правило из FRAUD_RULES имеет векторную реализацию в RULE_MASKS;
+результат совместим с bank.rep_fraud.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .fraud_rules import FRAUD_RULES
+
+
+TRANSACTION_COLUMNS = [
+    'transaction_id', 'transaction_date', 'amount', 'card_num',
+    'oper_type', 'oper_result', 'terminal'
+]
+EVENT_COLUMNS = ['event_dt', 'passport', 'fio', 'phone', 'event_type']
+EVENT_KEY = ['event_dt', 'passport', 'event_type']
+
+MAX_DATE = pd.Timestamp('9999-12-31')
+
+
+def _as_datetime(series):
+    """Приведение колонки к datetime64 (даты БД и строки из файлов)"""
+    return pd.to_datetime(series, errors='coerce')
+
+
+def _ne(series, value):
+    """Сравнение `<>` с NULL-семантикой SQL: NULL <> x не выполняется"""
+    return series.notna() & (series != value)
+
+
+def build_enrichment(cards, accounts, clients):
+    """
+    Обогащение карт (аналог refresh_enrichment.sql)
+
+    Для карты берется договор с наибольшим valid_to, NULL - первым,
+    как в ORDER BY ... DESC PostgreSQL
+    """
+    merged = (
+        cards[['card_num', 'account']]
+        .merge(
+            accounts[['account', 'valid_to', 'client']], on='account'
+        )
+        .merge(
+            clients, left_on='client', right_on='client_id'
+        )
+    )
+    merged['valid_to'] = _as_datetime(merged['valid_to'])
+    merged = merged.sort_values(
+        ['card_num', 'valid_to'], ascending=[True, False],
+        na_position='first', kind='stable'
+    ).drop_duplicates('card_num')
+
+    fio = (
+        merged['last_name'].fillna('') + ' '
+        + merged['first_name'].fillna('') + ' '
+        + merged['patronymic'].fillna('')
+    )
+    return pd.DataFrame({
+        'card_num': merged['card_num'],
+        'account_valid_to': merged['valid_to'],
+        'passport_num': merged['passport_num'],
+        'fio': fio,
+        'phone': merged['phone'],
+        'passport_valid_to': _as_datetime(merged['passport_valid_to']),
+        'date_of_birth': _as_datetime(merged['date_of_birth']),
+    }).reset_index(drop=True)
+
+
+def blacklist_entries(blacklist):
+    """Первая дата занесения паспорта в черный список"""
+    entries = pd.DataFrame({
+        'passport': blacklist['passport'],
+        'blacklist_entry_dt': _as_datetime(
+            blacklist['entry_dt'] if 'entry_dt' in blacklist
+            else blacklist['date']
+        ).dt.normalize(),
+    })
+    return entries.groupby('passport', as_index=False)['blacklist_entry_dt'].min()
+
+
+def apply_snapshot(history, snapshot, load_date, dimension):
+    """
+    Применение снимка измерения к истории версий (аналог load_dimensions.sql)
+
+    history - DataFrame с колонками ключа, отслеживаемыми колонками,
+    effective_from, effective_to, deleted_flg; возвращает новую историю
+    """
+    keys, columns = dimension.keys, dimension.columns
+    load_date = pd.Timestamp(load_date)
+    if history is None or history.empty:
+        history = pd.DataFrame(
+            columns=keys + columns
+            + ['effective_from', 'effective_to', 'deleted_flg']
+        )
+
+    src = snapshot[keys + columns].drop_duplicates(keys)
+    is_current = history['effective_to'] == MAX_DATE
+    cur = history[is_current]
+
+    diff = src.merge(
+        cur, on=keys, how='outer', suffixes=('', '_cur'), indicator=True
+    )
+    src_present = diff['_merge'] != 'right_only'
+    cur_present = diff['_merge'] != 'left_only'
+    changed = pd.Series(False, index=diff.index)
+    for column in columns:
+        left, right = diff[column], diff[f'{column}_cur']
+        changed |= ~((left == right) | (left.isna() & right.isna()))
+
+    inserted = ~cur_present
+    updated = src_present & cur_present & (
+        changed | (diff['deleted_flg'] == 1)
+    )
+    deleted = (
+        ~src_present & (diff['deleted_flg'] == 0) & (len(src) > 0)
+    )
+    diff = diff[inserted | updated | deleted].copy()
+    removed = ~src_present[diff.index]
+
+    # Для удаленных строк сохраняются значения последней версии
+    for column in columns:
+        diff[column] = diff[column].where(~removed, diff[f'{column}_cur'])
+
+    # Закрываем текущие версии (открытые в ту же дату перезаписываются)
+    affected = pd.MultiIndex.from_frame(history[keys]).isin(
+        pd.MultiIndex.from_frame(diff[keys])
+    ) & is_current.to_numpy()
+    same_day = affected & (history['effective_from'] >= load_date).to_numpy()
+    history = history.copy()
+    history.loc[affected & ~same_day, 'effective_to'] = (
+        load_date - pd.Timedelta(days=1)
+    )
+    history = history[~same_day]
+
+    versions = diff[keys + columns].assign(
+        effective_from=load_date,
+        effective_to=MAX_DATE,
+        deleted_flg=removed.astype(int).to_numpy(),
+    )
+    return pd.concat([history, versions], ignore_index=True)
+
+
+def select_history(facts, new, depth, minutes):
+    """
+    Хвост истории карт новых транзакций (аналог CTE stream)
+
+    depth последних операций карты до начала дня и операции
+    последних minutes минут перед началом дня
+    """
+    if facts is None or facts.empty or new.empty:
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS)
+
+    start = new['transaction_date'].min()
+    previous = facts[
+        facts['card_num'].isin(new['card_num'].unique())
+        & (facts['transaction_date'] < start)
+    ]
+    tail = (
+        previous.sort_values('transaction_date', kind='stable')
+        .groupby('card_num').tail(depth)
+        if depth > 0 else previous.iloc[0:0]
+    )
+    recent = previous[
+        previous['transaction_date'] >= start - pd.Timedelta(minutes=minutes)
+    ]
+    return (
+        pd.concat([tail, recent])[TRANSACTION_COLUMNS]
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+
+
+def _locate(stream, terminals):
+    """Город терминала по версии, действовавшей на момент операции"""
+    versions = terminals[terminals['deleted_flg'] == 0][
+        ['terminal_id', 'terminal_city', 'effective_from', 'effective_to']
+    ]
+    matched = stream[['terminal', 'transaction_date']].reset_index().merge(
+        versions, left_on='terminal', right_on='terminal_id'
+    )
+    # BETWEEN с датами: effective_to - полночь последнего дня версии
+    matched = matched[
+        (matched['transaction_date'] >= _as_datetime(matched['effective_from']))
+        & (matched['transaction_date'] <= _as_datetime(matched['effective_to']))
+    ].drop_duplicates('index')
+    return matched.set_index('index')['terminal_city'].reindex(stream.index)
+
+
+def _next_hour_features(stream):
+    """
+    Признаки правила 3 по операциям карты в интервале (t, t + 1 час]
+
+    Окно вперед по времени считается скользящим окном назад по
+    обращенному времени: [t' - 1 час, t') при t' = T - t
+    """
+    codes, _ = pd.factorize(stream['terminal_city'])
+    city_code = pd.Series(codes, index=stream.index, dtype='float64')
+    city_code[codes < 0] = np.nan
+
+    frame = pd.DataFrame({
+        'card_num': stream['card_num'],
+        'reversed_dt': pd.Timestamp('2000-01-01')
+        + (stream['transaction_date'].max() - stream['transaction_date']),
+        'city_code': city_code,
+        'is_new': stream['is_new'].astype('float64'),
+    }).sort_values(['card_num', 'reversed_dt'], kind='stable')
+
+    # frame упорядочен по карте, поэтому результат окна совпадает
+    # с ним построчно (индекс результата зависит от версии pandas)
+    window = frame.groupby('card_num', sort=False).rolling(
+        '1h', on='reversed_dt', closed='left', min_periods=1
+    )
+
+    def aggregate(column, func):
+        values = getattr(window[column], func)().to_numpy()
+        return pd.Series(values, index=frame.index)
+
+    own_city = frame['city_code']
+    min_city = aggregate('city_code', 'min')
+    max_city = aggregate('city_code', 'max')
+    has_new = aggregate('is_new', 'max')
+
+    differs = (
+        (min_city.notna() & (min_city != own_city))
+        | (max_city.notna() & (max_city != own_city))
+    )
+    return (
+        differs.reindex(stream.index).astype(bool),
+        (has_new.reindex(stream.index) > 0),
+    )
+
+
+def _previous_features(stream, depth):
+    """Признаки правила 4: предыдущие операции карты (LAG)"""
+    ordered = stream.sort_values(
+        ['card_num', 'transaction_date'], kind='stable'
+    )
+    grouped = ordered.groupby('card_num', sort=False)
+    features = {}
+    for n in range(1, depth + 1):
+        shifted = grouped[
+            ['oper_result', 'oper_type', 'amount', 'transaction_date']
+        ].shift(n)
+        features[f'prev{n}_result'] = shifted['oper_result']
+        features[f'prev{n}_type'] = shifted['oper_type']
+        features[f'prev{n}_amount'] = shifted['amount']
+        features[f'prev{n}_date'] = shifted['transaction_date']
+    return pd.DataFrame(features).reindex(stream.index)
+
+
+def _age_years(day, birth):
+    """Полных лет на дату (EXTRACT(YEAR FROM AGE(day, birth)))"""
+    before_birthday = (
+        (day.dt.month < birth.dt.month)
+        | ((day.dt.month == birth.dt.month) & (day.dt.day < birth.dt.day))
+    )
+    return day.dt.year - birth.dt.year - before_birthday.astype(int)
+
+
+def _expired_passport(e):
+    """Правило 1: просроченный или заблокированный паспорт"""
+    day = e['transaction_date'].dt.normalize()
+    return (
+        (e['passport_valid_to'].notna() & (e['passport_valid_to'] < day))
+        | (e['blacklist_entry_dt'] <= day)
+        | (e['passport_valid_to'].isna()
+           & (_age_years(day, e['date_of_birth']) < 45))
+    )
+
+
+def _expired_contract(e):
+    """Правило 2: недействующий договор"""
+    return e['account_valid_to'] < e['transaction_date'].dt.normalize()
+
+
+def _two_cities(e):
+    """Правило 3: операции в разных городах в течение часа"""
+    return (
+        e['terminal_city'].notna() & e['next_hour_differs']
+        & (e['is_new'] | e['next_hour_has_new'])
+    )
+
+
+def _amount_guessing(e):
+    """Правило 4: попытка подбора суммы"""
+    rejected = (
+        (e['prev1_result'] == 'REJECT') & (e['prev2_result'] == 'REJECT')
+        & (e['prev3_result'] == 'REJECT')
+        & _ne(e['prev1_type'], 'DEPOSIT') & _ne(e['prev2_type'], 'DEPOSIT')
+        & _ne(e['prev3_type'], 'DEPOSIT')
+    )
+    return (
+        rejected
+        & (e['oper_result'] == 'SUCCESS') & _ne(e['oper_type'], 'DEPOSIT')
+        & (e['prev1_amount'] > e['amount'])
+        & (e['prev2_amount'] > e['prev1_amount'])
+        & (e['prev3_amount'] > e['prev2_amount'])
+        & ((e['transaction_date'] - e['prev2_date'])
+           < pd.Timedelta(minutes=20))
+        & ((e['prev2_date'] - e['prev3_date']) < pd.Timedelta(minutes=20))
+    )
+
+
+# Векторные реализации правил по типу события (см. fraud_rules.py)
+RULE_MASKS = {
+    'Просроченный/заблокированный паспорт': _expired_passport,
+    'Недействующий договор': _expired_contract,
+    'Операции в разных городах в течение часа': _two_cities,
+    'Попытка подбора суммы': _amount_guessing,
+}
+
+
+def evaluate(new, history, terminals, enrichment, blacklist, rules=None):
+    """
+    События витрины по новым транзакциям дня
+
+    new, history - транзакции (TRANSACTION_COLUMNS, типизированные);
+    terminals - версии измерения терминалов; enrichment - результат
+    build_enrichment; blacklist - результат blacklist_entries.
+    Возвращает DataFrame с колонками EVENT_COLUMNS без дублей.
+    """
+    rules = FRAUD_RULES if rules is None else rules
+    missing = [r.event_type for r in rules if r.event_type not in RULE_MASKS]
+    if missing:
+        raise ValueError(
+            f"Нет векторной реализации правил: {', '.join(missing)}"
+        )
+    if new.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    stream = pd.concat([
+        new[TRANSACTION_COLUMNS].assign(is_new=True),
+        history[TRANSACTION_COLUMNS].assign(is_new=False),
+    ], ignore_index=True)
+    stream['transaction_date'] = _as_datetime(stream['transaction_date'])
+    stream['amount'] = pd.to_numeric(stream['amount'])
+
+    enrichment = enrichment.assign(**{
+        column: _as_datetime(enrichment[column])
+        for column in ('account_valid_to', 'passport_valid_to', 'date_of_birth')
+    })
+
+    stream['terminal_city'] = _locate(stream, terminals)
+    stream['next_hour_differs'], stream['next_hour_has_new'] = (
+        _next_hour_features(stream)
+    )
+    depth = max((rule.lookback for rule in rules), default=0)
+    stream = stream.join(_previous_features(stream, depth))
+
+    enriched = stream.merge(enrichment, on='card_num').merge(
+        blacklist, left_on='passport_num', right_on='passport', how='left'
+    )
+
+    events = []
+    for rule in rules:
+        mask = RULE_MASKS[rule.event_type](enriched).fillna(False)
+        if not rule.include_history:
+            mask &= enriched['is_new']
+        matched = enriched.loc[
+            mask.astype(bool),
+            ['transaction_date', 'passport_num', 'fio', 'phone']
+        ]
+        events.append(matched.assign(event_type=rule.event_type))
+
+    result = pd.concat(events, ignore_index=True)
+    result.columns = EVENT_COLUMNS
+    return result.drop_duplicates().reset_index(drop=True)
+
+
+def card_shards(frame, shards):
+    """Номер сегмента (0..shards-1) каждой строки по хэшу card_num"""
+    hashes = pd.util.hash_pandas_object(
+        frame['card_num'].astype(str), index=False
+    )
+    return (hashes.to_numpy() % np.uint64(shards)).astype(np.int64)
+
+
+def evaluate_sharded(new, history, terminals, enrichment, blacklist, shards,
+                     rules=None):
+    """
+    evaluate() по сегментам карт в shards рабочих процессах
+
+    Все правила локальны для карты: новые транзакции, история и обогащение
+    делятся по хэшу card_num, терминалы и черный список передаются
+    каждому процессу целиком. Результат совпадает с evaluate()
+    """
+    if shards <= 1 or new.empty:
+        return evaluate(new, history, terminals, enrichment, blacklist, rules)
+
+    new_shards = card_shards(new, shards)
+    history_shards = card_shards(history, shards)
+    enrichment_shards = card_shards(enrichment, shards)
+
+    # spawn: этап может выполняться в потоке планировщика,
+    # fork из многопоточного процесса небезопасен
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(shards, mp_context=context) as pool:
+        futures = [
+            pool.submit(
+                evaluate,
+                new[new_shards == shard],
+                history[history_shards == shard],
+                terminals,
+                enrichment[enrichment_shards == shard],
+                blacklist,
+                rules
+            )
+            for shard in range(shards)
+            if (new_shards == shard).any()
+        ]
+        parts = [future.result() for future in futures]
+
+    return pd.concat(parts, ignore_index=True).drop_duplicates().reset_index(
+        drop=True
+    )
+
+
+def compare_reports(expected, actual):
+    """
+    Сравнение двух отчетов по ключу витрины
+
+    Возвращает (отсутствующие в actual, лишние в actual)
+    """
+    def keys(frame):
+        frame = frame[EVENT_KEY].copy()
+        frame['event_dt'] = _as_datetime(frame['event_dt'])
+        return frame.drop_duplicates()
+
+    merged = keys(expected).merge(
+        keys(actual), on=EVENT_KEY, how='outer', indicator=True
+    )
+    missing = merged[merged['_merge'] == 'left_only'][EVENT_KEY]
+    extra = merged[merged['_merge'] == 'right_only'][EVENT_KEY]
+    return missing.reset_index(drop=True), extra.reset_index(drop=True)
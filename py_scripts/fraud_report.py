@@ -0,0 +1,214 @@
+"""
+Выборка и выгрузка витрины мошенничества bank.rep_fraud
+
+Фильтры передаются связанными параметрами, период задается полуоткрытым
+интервалом event_dt >= начало AND event_dt < конец, поэтому запрос
+использует индекс idx_fraud_event_dt и отсечение секций.
+"""
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from .file_utils import normalize_date
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # выгрузка в Parquet недоступна
+    pa = None
+    pq = None
+
+
+REPORT_COLUMNS = [
+    'event_dt', 'passport', 'fio', 'phone', 'event_type', 'report_dt'
+]
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+
+def _day_start(value):
+    """Начало суток для даты (DDMMYYYY, date или datetime)"""
+    if isinstance(value, datetime):
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.strptime(normalize_date(value), '%d%m%Y')
+
+
+def _report_filters(date_from=None, date_to=None, event_types=None,
+                    passports=None):
+    """
+    Условие WHERE и параметры фильтров витрины (стиль psycopg2)
+
+    date_from и date_to включаются целиком; если указана только date_from,
+    выбираются события за одни сутки
+    """
+    conditions = []
+    params = {}
+
+    if date_from is not None:
+        start = _day_start(date_from)
+        end = _day_start(date_to if date_to is not None else date_from)
+        if start > end:
+            raise ValueError(
+                f"Начальная дата {date_from} позже конечной {date_to}"
+            )
+        conditions.append("event_dt >= %(start_dt)s")
+        conditions.append("event_dt < %(end_dt)s")
+        params['start_dt'] = start
+        params['end_dt'] = end + timedelta(days=1)
+    elif date_to is not None:
+        conditions.append("event_dt < %(end_dt)s")
+        params['end_dt'] = _day_start(date_to) + timedelta(days=1)
+
+    if event_types:
+        conditions.append("event_type = ANY(%(event_types)s)")
+        params['event_types'] = list(event_types)
+
+    if passports:
+        conditions.append("passport = ANY(%(passports)s)")
+        params['passports'] = list(passports)
+
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+
+def build_report_query(**filters):
+    """SQL-запрос к витрине и его параметры (стиль psycopg2)"""
+    where, params = _report_filters(**filters)
+    query = (
+        f"SELECT {', '.join(REPORT_COLUMNS)} FROM bank.rep_fraud{where}"
+        " ORDER BY event_dt DESC"
+    )
+    return query, params
+
+
+def build_summary_query(**filters):
+    """SQL-запрос числа событий витрины по типам и его параметры"""
+    where, params = _report_filters(**filters)
+    query = (
+        f"SELECT event_type, count(*) FROM bank.rep_fraud{where}"
+        " GROUP BY event_type ORDER BY event_type"
+    )
+    return query, params
+
+
+def report_version(connection):
+    """Отметка последнего обновления витрины из meta_last_update или None"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT last_update_date FROM bank.meta_last_update "
+            "WHERE table_name = %s",
+            ('rep_fraud',)
+        )
+        row = cursor.fetchone()
+    connection.commit()
+    return row[0] if row else None
+
+
+def fetch_report(connection, **filters):
+    """Отчет в DataFrame (для небольших периодов)"""
+    query, params = build_report_query(**filters)
+    return _fetch(connection, query, params, REPORT_COLUMNS)
+
+
+def fetch_summary(connection, **filters):
+    """Число событий по типам: Series event_type -> количество"""
+    query, params = build_summary_query(**filters)
+    summary = _fetch(connection, query, params, ['event_type', 'events'])
+    return summary.set_index('event_type')['events']
+
+
+def _fetch(connection, query, params, columns):
+    """Результат запроса в DataFrame"""
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    connection.commit()
+    return pd.DataFrame(rows, columns=columns)
+
+
+def export_report(connection, path, fmt=None, fetch_size=50000, **filters):
+    """
+    Потоковая выгрузка отчета в CSV или Parquet
+
+    CSV пишется сервером через COPY (...) TO STDOUT, Parquet - пачками
+    по fetch_size строк из серверного курсора; в памяти одновременно
+    находится не больше одной пачки. Возвращает количество строк.
+    """
+    logger = logging.getLogger(__name__)
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Неподдерживаемый формат выгрузки: {fmt}. "
+            f"Используйте {', '.join(EXPORT_FORMATS)}"
+        )
+
+    query, params = build_report_query(**filters)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    started = time.perf_counter()
+
+    if fmt == 'csv':
+        rows = _export_csv(connection, path, query, params)
+    else:
+        rows = _export_parquet(connection, path, query, params, fetch_size)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Отчет выгружен в {path}: {rows} строк за {elapsed:.2f} с"
+    )
+    return rows
+
+
+def _export_csv(connection, path, query, params):
+    """Выгрузка через COPY TO STDOUT прямо в файл"""
+    with connection.cursor() as cursor:
+        bound_query = cursor.mogrify(query, params).decode('utf-8')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            cursor.copy_expert(
+                f"COPY ({bound_query}) TO STDOUT "
+                f"WITH (FORMAT csv, HEADER true, DELIMITER ';')",
+                f
+            )
+        rows = cursor.rowcount
+    connection.commit()
+    return rows
+
+
+def _export_parquet(connection, path, query, params, fetch_size):
+    """Выгрузка пачками из серверного курсора, по row group на пачку"""
+    if pq is None:
+        raise ImportError(
+            "Для выгрузки в Parquet установите pyarrow: pip install pyarrow"
+        )
+
+    schema = pa.schema([
+        ('event_dt', pa.timestamp('us')),
+        ('passport', pa.string()),
+        ('fio', pa.string()),
+        ('phone', pa.string()),
+        ('event_type', pa.string()),
+        ('report_dt', pa.timestamp('us')),
+    ])
+
+    rows = 0
+    with connection.cursor(name='rep_fraud_export') as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(query, params)
+        with pq.ParquetWriter(path, schema) as writer:
+            while True:
+                batch = cursor.fetchmany(fetch_size)
+                if not batch:
+                    break
+                frame = pd.DataFrame(batch, columns=REPORT_COLUMNS)
+                writer.write_table(
+                    pa.Table.from_pandas(
+                        frame, schema=schema, preserve_index=False
+                    )
+                )
+                rows += len(batch)
+    connection.commit()
+    return rows
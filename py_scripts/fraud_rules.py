@@ -0,0 +1,164 @@
+"""
+Декларативные правила выявления мошенничества
+
+Каждое правило описывает тип события, оконные признаки (features)
+и условие над обогащенной транзакцией. Все правила вычисляются
+одним запросом по шаблону build_fraud_report.sql.
+"""
+
+
+class FraudRule:
+    """Описание правила выявления мошенничества"""
+
+    def __init__(self, event_type, condition, features=None, lookback=0,
+                 lookback_minutes=0, include_history=False):
+        self.event_type = event_type
+        # SQL-условие над колонками обогащенной транзакции
+        self.condition = condition
+        # Оконные признаки: имя колонки -> SQL-выражение (окно card_window)
+        self.features = features or {}
+        # Сколько предыдущих транзакций карты за прошлые дни нужно правилу
+        self.lookback = lookback
+        # За сколько минут до начала дня нужны операции прошлого дня
+        self.lookback_minutes = lookback_minutes
+        # Может ли правило срабатывать на транзакциях прошлых дней
+        self.include_history = include_history
+
+
+FRAUD_RULES = [
+    # 1. Операции при просроченном/заблокированном паспорте
+    FraudRule(
+        'Просроченный/заблокированный паспорт',
+        """
+            -- Просроченный паспорт: транзакция ПОСЛЕ истечения срока действия
+            (passport_valid_to IS NOT NULL AND passport_valid_to < transaction_date::DATE)
+            -- Заблокированный паспорт: паспорт в черном списке
+            OR blacklist_entry_dt <= transaction_date::DATE
+            -- Подозрительный случай: NULL для людей младше 45 лет на дату транзакции
+            OR (passport_valid_to IS NULL AND EXTRACT(YEAR FROM AGE(transaction_date::DATE, date_of_birth)) < 45)
+        """
+    ),
+    # 2. Операции при недействующем договоре
+    FraudRule(
+        'Недействующий договор',
+        "account_valid_to < transaction_date::DATE"
+    ),
+    # 3. Операции в разных городах в течение часа
+    FraudRule(
+        'Операции в разных городах в течение часа',
+        """
+            terminal_city IS NOT NULL
+            AND (next_hour_min_city <> terminal_city OR next_hour_max_city <> terminal_city)
+            -- операция прошлого дня попадает в отчет, только если в ее окне есть новые
+            AND (is_new OR next_hour_has_new)
+        """,
+        features={
+            # города последующих операций по карте в интервале (t, t + 1 час]
+            'next_hour_min_city': (
+                "MIN(terminal_city) OVER (card_window RANGE BETWEEN "
+                "CURRENT ROW AND INTERVAL '1 hour' FOLLOWING EXCLUDE GROUP)"
+            ),
+            'next_hour_max_city': (
+                "MAX(terminal_city) OVER (card_window RANGE BETWEEN "
+                "CURRENT ROW AND INTERVAL '1 hour' FOLLOWING EXCLUDE GROUP)"
+            ),
+            'next_hour_has_new': (
+                "BOOL_OR(is_new) OVER (card_window RANGE BETWEEN "
+                "CURRENT ROW AND INTERVAL '1 hour' FOLLOWING EXCLUDE GROUP)"
+            ),
+        },
+        lookback_minutes=60,
+        include_history=True
+    ),
+    # 4. Попытка подбора суммы
+    FraudRule(
+        'Попытка подбора суммы',
+        """
+            -- предыдущие три транзакции были отклонены и не были депозитами
+            prev1_result = 'REJECT' AND prev2_result = 'REJECT' AND prev3_result = 'REJECT'
+            AND prev1_type <> 'DEPOSIT' AND prev2_type <> 'DEPOSIT' AND prev3_type <> 'DEPOSIT'
+            -- текущая транзакция успешна и не является депозитом
+            AND oper_result = 'SUCCESS' AND oper_type <> 'DEPOSIT'
+            -- суммы убывают от транзакции к транзакции
+            AND prev1_amount > amount
+            AND prev2_amount > prev1_amount
+            AND prev3_amount > prev2_amount
+            -- интервал между транзакциями меньше 20 минут
+            AND (transaction_date - prev2_date) < INTERVAL '20 minutes'
+            AND (prev2_date - prev3_date) < INTERVAL '20 minutes'
+        """,
+        features={
+            'prev1_result': "LAG(oper_result, 1) OVER card_window",
+            'prev2_result': "LAG(oper_result, 2) OVER card_window",
+            'prev3_result': "LAG(oper_result, 3) OVER card_window",
+            'prev1_type': "LAG(oper_type, 1) OVER card_window",
+            'prev2_type': "LAG(oper_type, 2) OVER card_window",
+            'prev3_type': "LAG(oper_type, 3) OVER card_window",
+            'prev1_amount': "LAG(amount, 1) OVER card_window",
+            'prev2_amount': "LAG(amount, 2) OVER card_window",
+            'prev3_amount': "LAG(amount, 3) OVER card_window",
+            'prev2_date': "LAG(transaction_date, 2) OVER card_window",
+            'prev3_date': "LAG(transaction_date, 3) OVER card_window",
+        },
+        lookback=3
+    ),
+]
+
+
+# Вставка событий в витрину: повторные события пропускаются
+REPORT_INSERT = """
+INSERT INTO bank.rep_fraud (event_dt, passport, fio, phone, event_type)
+{events}
+ON CONFLICT (event_dt, passport, event_type) DO NOTHING
+RETURNING event_type
+"""
+
+
+def shard_condition(column, shard=0, shards=1):
+    """SQL-условие принадлежности строки сегменту shard из shards по хэшу"""
+    if shards <= 1:
+        return 'TRUE'
+    return f"(hashtext({column}) & 2147483647) % {shards} = {shard}"
+
+
+def build_fraud_events_sql(template, rules=None, stg_suffix='temp', shard=0,
+                           shards=1):
+    """
+    Собирает запрос событий витрины из шаблона и списка правил
+
+    При shards > 1 запрос вычисляет события только для карт сегмента
+    shard: все правила локальны для карты, поэтому сегменты независимы
+    """
+    rules = FRAUD_RULES if rules is None else rules
+
+    features = {}
+    for rule in rules:
+        features.update(rule.features)
+
+    rule_features = ''.join(
+        f",\n        {expression} AS {name}"
+        for name, expression in features.items()
+    )
+    rule_cases = ',\n'.join(
+        f"    (CASE WHEN {'' if rule.include_history else 'is_new AND '}"
+        f"({rule.condition.rstrip()}\n    )"
+        f"\n     THEN '{rule.event_type}' END)"
+        for rule in rules
+    )
+    history_depth = max((rule.lookback for rule in rules), default=0)
+    history_minutes = max(
+        (rule.lookback_minutes for rule in rules), default=0
+    )
+    return template.format(
+        rule_features=rule_features, rule_cases=rule_cases,
+        history_depth=history_depth, history_minutes=history_minutes,
+        stg_suffix=stg_suffix,
+        shard_condition=shard_condition('card_num', shard, shards)
+    )
+
+
+def build_fraud_report_sql(template, rules=None, stg_suffix='temp'):
+    """Собирает единый запрос вставки событий в витрину"""
+    return REPORT_INSERT.format(
+        events=build_fraud_events_sql(template, rules, stg_suffix).strip()
+    )
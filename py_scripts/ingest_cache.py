@@ -0,0 +1,135 @@
+"""
+Кэш разобранных исходных файлов в формате Feather (Arrow IPC)
+
+Запись кэша - файл <имя исходника>.<sha256 содержимого>.feather.
+Поиск идет по хэшу содержимого, поэтому измененный исходник никогда
+не читается из устаревшей записи, а одинаковые снимки за разные дни
+разбираются один раз. Объем кэша ограничен: при превышении удаляются
+записи, к которым дольше всего не обращались (LRU по времени изменения).
+"""
+import glob
+import logging
+import os
+import threading
+
+from .file_index import file_hash
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # кэш отключен
+    pa = None
+    feather = None
+
+
+CACHE_SUFFIX = '.feather'
+
+
+class IngestCache:
+    """Ограниченный по объему LRU-кэш разобранных файлов"""
+
+    def __init__(self, cache_dir, max_size_mb=512):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        if cache_dir and feather is None:
+            self.logger.warning(
+                "pyarrow не установлен, кэш разобранных файлов отключен"
+            )
+
+    @property
+    def enabled(self):
+        """Кэш включен: задан каталог и установлен pyarrow"""
+        return feather is not None and bool(self.cache_dir)
+
+    def get_or_load(self, file_path, loader, content_hash=None):
+        """
+        DataFrame из кэша или результат loader() с сохранением в кэш
+
+        Запись читается через memory map без копирования буферов колонок;
+        content_hash - известный хэш содержимого (например, из индекса
+        архива), иначе файл хэшируется
+        """
+        if not self.enabled:
+            return loader()
+
+        content_hash = content_hash or file_hash(file_path)
+        cached = self._find(content_hash)
+        if cached is not None:
+            try:
+                table = feather.read_table(cached, memory_map=True)
+                os.utime(cached)
+                self.logger.info(
+                    f"Файл {file_path} прочитан из кэша: {cached}"
+                )
+                return table.to_pandas()
+            except (OSError, pa.ArrowInvalid) as e:
+                self.logger.warning(
+                    f"Поврежденная запись кэша {cached} удалена: {str(e)}"
+                )
+                self._remove(cached)
+
+        data_frame = loader()
+        try:
+            self._store(file_path, content_hash, data_frame)
+        except (OSError, pa.ArrowException) as e:
+            self.logger.warning(
+                f"Не удалось сохранить {file_path} в кэш: {str(e)}"
+            )
+        return data_frame
+
+    def _find(self, content_hash):
+        """Путь к записи с указанным хэшем содержимого или None"""
+        matches = glob.glob(
+            os.path.join(self.cache_dir, f"*.{content_hash}{CACHE_SUFFIX}")
+        )
+        return matches[0] if matches else None
+
+    def _store(self, file_path, content_hash, data_frame):
+        """Запись в кэш с удалением устаревших версий того же исходника"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_name = os.path.basename(file_path)
+        path = os.path.join(
+            self.cache_dir, f"{file_name}.{content_hash}{CACHE_SUFFIX}"
+        )
+
+        # Исходник изменился: прежние записи для него больше не нужны
+        for stale in glob.glob(
+            os.path.join(self.cache_dir, f"{glob.escape(file_name)}.*")
+        ):
+            if stale != path:
+                self._remove(stale)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        table = pa.Table.from_pandas(data_frame, preserve_index=False)
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """Удаление давно не использованных записей сверх лимита объема"""
+        with self._lock:
+            entries = []
+            for path in glob.glob(
+                os.path.join(self.cache_dir, f"*{CACHE_SUFFIX}")
+            ):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path):
+        """Удаление записи кэша (ее могли удалить параллельно)"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,120 @@
+"""
+Буфер записей метаданных загрузки (meta_load_info, meta_last_update)
+
+Записи копятся в памяти и пишутся пакетно в транзакции этапа,
+который они описывают: загрузка файла фиксируется вместе с данными
+измерений или фактов, отметка об обновлении таблицы - вместе
+с самим обновлением.
+"""
+import os
+import threading
+
+from sqlalchemy import text
+
+
+class MetadataBuffer:
+    """Потокобезопасный буфер метаданных по датам загрузки"""
+
+    def __init__(self):
+        self._loads = []
+        self._updates = []
+        self._lock = threading.Lock()
+
+    def log_load(self, date_str, file_type, file_name, records_loaded,
+                 status, error_message=None, records_rejected=0):
+        """Запись о загрузке файла в bank.meta_load_info"""
+        record = {
+            'date_str': date_str,
+            'load_date': f"{date_str[4:]}-{date_str[2:4]}-{date_str[:2]}",
+            'file_type': file_type,
+            'file_name': os.path.basename(file_name) if file_name else None,
+            'records_loaded': (
+                int(records_loaded) if records_loaded is not None else 0
+            ),
+            'records_rejected': int(records_rejected or 0),
+            'load_status': status,
+            'error_message': error_message,
+        }
+        with self._lock:
+            self._loads.append(record)
+
+    def touch(self, date_str, table_name, update_type):
+        """Отметка об обновлении таблицы в bank.meta_last_update"""
+        with self._lock:
+            self._updates.append({
+                'date_str': date_str, 't': table_name, 'tp': update_type
+            })
+
+    def pop(self, date_str):
+        """Забирает все записи даты (для передачи в другой процесс)"""
+        with self._lock:
+            loads = [r for r in self._loads if r['date_str'] == date_str]
+            updates = [r for r in self._updates if r['date_str'] == date_str]
+            self._loads = [
+                r for r in self._loads if r['date_str'] != date_str
+            ]
+            self._updates = [
+                r for r in self._updates if r['date_str'] != date_str
+            ]
+        return loads, updates
+
+    def extend(self, records):
+        """Добавляет записи, полученные через pop()"""
+        loads, updates = records
+        with self._lock:
+            self._loads.extend(loads)
+            self._updates.extend(updates)
+
+    def flush(self, conn, date_str, file_types=None, tables=None):
+        """
+        Пакетная запись метаданных даты в открытой транзакции conn
+
+        file_types ограничивает записи meta_load_info типами файлов этапа,
+        tables - отметки meta_last_update таблицами этапа, чтобы этап
+        не зафиксировал метаданные параллельного. Фиксацию выполняет
+        вызывающий.
+        """
+        with self._lock:
+            loads = [
+                r for r in self._loads
+                if r['date_str'] == date_str
+                and (file_types is None or r['file_type'] in file_types)
+            ]
+            updates = [
+                r for r in self._updates
+                if r['date_str'] == date_str
+                and (tables is None or r['t'] in tables)
+            ]
+            self._loads = [r for r in self._loads if r not in loads]
+            self._updates = [r for r in self._updates if r not in updates]
+
+        try:
+            if loads:
+                conn.execute(text(
+                    """
+                    INSERT INTO bank.meta_load_info(
+                        load_date, file_type, file_name, records_loaded,
+                        records_rejected, load_status, error_message
+                    ) VALUES (
+                        :load_date, :file_type, :file_name, :records_loaded,
+                        :records_rejected, :load_status, :error_message
+                    )
+                    """
+                ), loads)
+            if updates:
+                conn.execute(text(
+                    """
+                    INSERT INTO bank.meta_last_update(
+                        table_name, last_update_date, last_update_type
+                    )
+                    VALUES (:t, CURRENT_TIMESTAMP, :tp)
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        last_update_date = EXCLUDED.last_update_date,
+                        last_update_type = EXCLUDED.last_update_type
+                    """
+                ), updates)
+        except Exception:
+            # Транзакция этапа откатится: возвращаем записи в буфер
+            self.extend((loads, updates))
+            raise
+        return len(loads) + len(updates)
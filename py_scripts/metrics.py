@@ -0,0 +1,162 @@
+"""
+Сбор метрик производительности этапов ETL-процесса
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # нет на Windows
+    resource = None
+
+
+def process_peak_rss_mb():
+    """
+    Пиковое потребление памяти (RSS) процесса в МБ
+
+    Максимум за все время жизни процесса: после самого тяжелого этапа
+    все следующие получают то же значение
+    """
+    if resource is None:
+        return None
+    # На Linux ru_maxrss в КБ, на macOS - в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+class MetricsCollector:
+    """
+    Потокобезопасный сборщик метрик этапов
+
+    Для каждой записи сохраняются время выполнения, количество строк,
+    строк/с и пиковый RSS процесса с его запуска на момент окончания
+    этапа (накопительный, не потребление этапа).
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or (
+            f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        )
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, date_str, stage, duration, rows=None, status='SUCCESS',
+               statement_index=None, details=None, started_at=None):
+        """Добавление записи о выполнении этапа или SQL-команды"""
+        rows_per_sec = None
+        if rows is not None and duration > 0:
+            rows_per_sec = rows / duration
+
+        record = {
+            'run_id': self.run_id,
+            'load_date': date_str,
+            'stage': stage,
+            'statement_index': statement_index,
+            'status': status,
+            'duration_sec': duration,
+            'rows': rows,
+            'rows_per_sec': rows_per_sec,
+            'process_peak_rss_mb': process_peak_rss_mb(),
+            'started_at': started_at,
+            'details': details,
+        }
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def wrap(self, date_str, stage, func):
+        """
+        Оборачивает функцию этапа замером времени
+
+        Если функция возвращает int, он считается количеством строк
+        """
+        def measured():
+            started_at = datetime.now()
+            started = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                self.record(
+                    date_str, stage, time.perf_counter() - started,
+                    status='ERROR', details=str(e)[:255],
+                    started_at=started_at
+                )
+                raise
+            rows = result if isinstance(result, int) else None
+            self.record(
+                date_str, stage, time.perf_counter() - started, rows,
+                started_at=started_at
+            )
+            return result
+        return measured
+
+    def statement_callback(self, date_str, stage):
+        """Колбэк для поштучного учета SQL-команд скрипта"""
+        def on_statement(index, command, duration, rows):
+            self.record(
+                date_str, stage, duration,
+                rows if rows is not None and rows >= 0 else None,
+                statement_index=index, details=command[:255]
+            )
+        return on_statement
+
+    def pop_records(self, date_str=None):
+        """Забирает накопленные записи (все или за указанную дату)"""
+        with self._lock:
+            if date_str is None:
+                records, self.records = self.records, []
+            else:
+                records = [
+                    r for r in self.records if r['load_date'] == date_str
+                ]
+                self.records = [
+                    r for r in self.records if r['load_date'] != date_str
+                ]
+        return records
+
+    def write_json(self, records, path):
+        """Запись метрик в JSON-файл (по строке на запись)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, default=str, ensure_ascii=False))
+                f.write('\n')
+
+    def write_prometheus(self, records, path):
+        """Запись метрик этапов в textfile-формате Prometheus"""
+        metrics = [
+            ('etl_stage_duration_seconds', 'duration_sec',
+             'Время выполнения этапа ETL'),
+            ('etl_stage_rows', 'rows', 'Количество обработанных строк'),
+            ('etl_stage_rows_per_second', 'rows_per_sec',
+             'Пропускная способность этапа'),
+            ('etl_process_peak_rss_megabytes', 'process_peak_rss_mb',
+             'Пиковый RSS процесса с запуска на конец этапа'),
+        ]
+        # Только записи этапов, без отдельных SQL-команд
+        stages = [r for r in records if r['statement_index'] is None]
+
+        lines = []
+        for name, key, description in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for r in stages:
+                if r[key] is None:
+                    continue
+                labels = (
+                    f'load_date="{r["load_date"]}",'
+                    f'stage="{r["stage"]}",status="{r["status"]}"'
+                )
+                lines.append(f"{name}{{{labels}}} {r[key]}")
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
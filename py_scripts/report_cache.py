@@ -0,0 +1,81 @@
+"""
+Кэш результатов запросов к витрине мошенничества
+
+Ключ записи - текст запроса и его параметры, поэтому одинаковые
+фильтры, переданные в разных форматах даты, попадают в одну запись.
+Записи действительны, пока не изменилась отметка meta_last_update
+витрины: при новой отметке кэш очищается целиком. Число записей
+ограничено, при превышении удаляется запись, к которой дольше всего
+не обращались (LRU).
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+
+def cache_key(kind, query, params):
+    """Ключ записи: вид результата, запрос и параметры (списки - кортежами)"""
+    return (kind, query, tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in params.items()
+    )))
+
+
+class ReportCache:
+    """Потокобезопасный LRU-кэш результатов запросов к витрине"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = int(max_entries)
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """Кэш включен: разрешена хотя бы одна запись"""
+        return self.max_entries > 0
+
+    def get_or_load(self, key, version, loader):
+        """
+        Результат из кэша или loader() с сохранением в кэш
+
+        version - отметка meta_last_update витрины; записи, полученные
+        при другой отметке, удаляются. Возвращается копия, чтобы
+        изменения вызывающего не попадали в кэш
+        """
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.logger.info(
+                        f"Витрина обновлена ({version}), кэш отчетов очищен"
+                    )
+                self._entries.clear()
+                self._version = version
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached.copy()
+            self.misses += 1
+
+        result = loader()
+        with self._lock:
+            # Пока выполнялся запрос, витрина могла обновиться
+            if version == self._version:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result.copy()
+
+    def clear(self):
+        """Удаление всех записей"""
+        with self._lock:
+            self._entries.clear()
+            self._version = None
@@ -0,0 +1,102 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """Этап ETL-процесса с явными зависимостями"""
+
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+
+class StageGraph:
+    """
+    Граф этапов ETL-процесса
+
+    Этапы без взаимных зависимостей выполняются параллельно в пуле
+    потоков; этап запускается сразу, как только готовы все его входы.
+    Для каждого этапа сохраняется запись о времени выполнения.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timings = {}
+        self.results = {}
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, name, func, depends_on=()):
+        """Добавление этапа в граф"""
+        if name in self.stages:
+            raise ValueError(f"Этап '{name}' уже добавлен в граф")
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(
+                    f"Этап '{name}' зависит от неизвестного этапа "
+                    f"'{dependency}'"
+                )
+        self.stages[name] = Stage(name, func, depends_on)
+        return self
+
+    def _run_stage(self, stage):
+        """Выполнение этапа с записью времени"""
+        record = {
+            'stage': stage.name,
+            'started_at': time.time(),
+            'status': 'RUNNING'
+        }
+        self.timings[stage.name] = record
+        started = time.perf_counter()
+        try:
+            result = stage.func()
+            record['status'] = 'SUCCESS'
+            return result
+        except Exception:
+            record['status'] = 'ERROR'
+            raise
+        finally:
+            record['duration'] = time.perf_counter() - started
+            self.logger.info(
+                f"Этап '{stage.name}': {record['status']} "
+                f"за {record['duration']:.2f} с"
+            )
+
+    def run(self):
+        """Выполнение графа; возвращает результаты этапов по именам"""
+        pending = dict(self.stages)
+        done = set()
+        running = {}
+        error = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if error is None:
+                    ready = [
+                        stage for stage in pending.values()
+                        if all(d in done for d in stage.depends_on)
+                    ]
+                    for stage in ready:
+                        del pending[stage.name]
+                        future = pool.submit(self._run_stage, stage)
+                        running[future] = stage.name
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                        done.add(name)
+                    except Exception as e:
+                        # Новые этапы не запускаем, дожидаемся запущенных
+                        if error is None:
+                            error = e
+
+        if error is not None:
+            raise error
+        return self.results
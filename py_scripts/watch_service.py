@@ -0,0 +1,249 @@
+"""
+Резидентный режим: наблюдение за каталогом файлов и загрузка по мере поступления
+
+Один экземпляр ETLPipeline (пул соединений, кэши) живет все время работы
+сервиса, проверка схемы выполняется один раз при старте. Для каждой
+даты строится граф этапов, в котором этапы staging ждут появления своего
+файла: файл загружается в staging сразу, как только запись в него
+завершена, измерения - как только загружены терминалы, факты - после
+транзакций и черного списка, витрина - после измерений и фактов.
+Измерения и факты даты применяются только после завершения всех
+более ранних дат.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from functools import partial
+
+from .db_utils import raw_connection
+from .stage_graph import StageGraph
+
+
+# Имя файла -> (тип файла, дата DDMMYYYY)
+FILE_PATTERN = re.compile(
+    r'^(transactions|passport_blacklist|terminals)_(\d{8})\.(txt|xlsx)$'
+)
+FILE_TYPES = {
+    'transactions': 'transactions',
+    'passport_blacklist': 'blacklist',
+    'terminals': 'terminals',
+}
+
+
+class ServiceStopped(Exception):
+    """Сервис остановлен до поступления файла"""
+
+
+class DateLoad:
+    """Состояние загрузки одной даты"""
+
+    def __init__(self, date_str):
+        self.date_str = date_str
+        self.day = datetime.strptime(date_str, '%d%m%Y')
+        self.files = {file_type: None for file_type in FILE_TYPES.values()}
+        self.arrived = {
+            file_type: threading.Event() for file_type in FILE_TYPES.values()
+        }
+        self.first_seen = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+        self.thread = None
+
+
+class WatchService:
+    """Наблюдение за paths.files_dir и загрузка файлов по мере поступления"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        settings = pipeline.config.get('watch', {})
+        self.files_dir = pipeline.config['paths']['files_dir']
+        self.poll_interval = float(settings.get('poll_interval_sec', 2))
+        # Сколько ждать недостающие файлы даты с момента появления первого
+        self.file_timeout = float(settings.get('file_timeout_sec', 3600))
+        self.logger = logging.getLogger(__name__)
+        self.stop_event = threading.Event()
+        self._loads = {}
+        self._lock = threading.Lock()
+        # Путь -> (размер, время изменения) при предыдущем опросе
+        self._sizes = {}
+        # Файлы, переданные в загрузку (или неуспешные, до изменения)
+        self._taken = {}
+
+    def run(self):
+        """Основной цикл сервиса (до stop() или Ctrl+C)"""
+        with raw_connection(self.pipeline.engine) as conn:
+            self.pipeline.db_manager.ensure_database_ready(conn)
+        self.logger.info(
+            f"Наблюдение за каталогом {self.files_dir} "
+            f"(опрос каждые {self.poll_interval:g} с)"
+        )
+        try:
+            while not self.stop_event.is_set():
+                self.poll()
+                self.stop_event.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            self.logger.info("Получен сигнал остановки")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Остановка: ожидающие этапы прерываются, запущенные дожидаемся"""
+        self.stop_event.set()
+        with self._lock:
+            loads = list(self._loads.values())
+        for load in loads:
+            if load.thread is not None:
+                load.thread.join()
+
+    def poll(self):
+        """Один опрос каталога: передача в загрузку дописанных файлов"""
+        for path, file_type, date_str in self._ready_files():
+            with self._lock:
+                load = self._loads.get(date_str)
+                if load is None:
+                    load = self._start_date(date_str)
+                load.files[file_type] = path
+                load.arrived[file_type].set()
+            self.logger.info(f"Поступил файл {path}")
+
+    def _ready_files(self):
+        """Файлы, размер и время изменения которых не менялись с прошлого опроса"""
+        try:
+            entries = list(os.scandir(self.files_dir))
+        except FileNotFoundError:
+            return []
+
+        ready = []
+        current = {}
+        for entry in entries:
+            match = FILE_PATTERN.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            stat = entry.stat()
+            state = (stat.st_size, stat.st_mtime)
+            current[entry.path] = state
+            if self._taken.get(entry.path) == state:
+                continue
+            if self._sizes.get(entry.path) == state and stat.st_size > 0:
+                self._taken[entry.path] = state
+                ready.append(
+                    (entry.path, FILE_TYPES[match.group(1)], match.group(2))
+                )
+
+        self._sizes = current
+        # Файлы, ушедшие из каталога (архивированы), больше не отслеживаем
+        self._taken = {
+            path: state for path, state in self._taken.items()
+            if path in current
+        }
+        return ready
+
+    def _start_date(self, date_str):
+        """Создание графа этапов даты и запуск его в отдельном потоке"""
+        load = DateLoad(date_str)
+        self._loads[date_str] = load
+        load.thread = threading.Thread(
+            target=self._run_date, args=(load,),
+            name=f"etl-{date_str}"
+        )
+        load.thread.start()
+        return load
+
+    def _run_date(self, load):
+        """
+        Выполнение графа даты в staging-таблицах stg_*_ДДММГГГГ
+
+        Staging-таблицы удаляются только после успешной загрузки: после
+        ошибки дата продолжается с незавершенного этапа по контрольным
+        точкам, когда ее файлы снова будут взяты в работу
+        """
+        pipeline = self.pipeline
+        date_str = load.date_str
+        # Потоки ожидания файлов не должны занимать рабочие потоки этапов
+        graph = StageGraph(
+            pipeline._scheduler_workers() + len(FILE_TYPES) + 1
+        )
+        for file_type, meta_type, handler in pipeline._staging_handlers():
+            graph.add(
+                f'stage_{file_type}',
+                partial(
+                    self._stage_when_arrived, load, file_type, meta_type,
+                    handler
+                )
+            )
+        graph.add('previous_dates', partial(self._wait_previous, load))
+        pipeline._add_apply_stages(
+            graph, date_str, load.files, suffix=date_str,
+            after=['previous_dates']
+        )
+
+        try:
+            pipeline._begin_date(date_str, resume=True)
+            pipeline._create_stage_tables(date_str)
+            pipeline._run_graph(graph, date_str)
+            pipeline._register_files(date_str)
+            pipeline._drop_stage_tables(date_str)
+            self.logger.info(f"Дата {date_str} загружена")
+        except Exception as e:
+            load.error = e
+            self.logger.error(
+                f"Ошибка при обработке данных за дату {date_str}: {str(e)}"
+            )
+            pipeline._log_meta_errors(date_str, load.files, e)
+        finally:
+            pipeline.file_fingerprints.pop(date_str, None)
+            pipeline._flush_meta(date_str)
+            pipeline.resume_points.pop(date_str, None)
+            pipeline._flush_metrics(date_str)
+            with self._lock:
+                self._loads.pop(date_str, None)
+            load.done.set()
+
+    def _stage_when_arrived(self, load, file_type, meta_type, handler):
+        """
+        Этап staging: ожидание файла и загрузка
+
+        Если файл не поступил за file_timeout с момента появления первого
+        файла даты, этап завершается без загрузки
+        """
+        while not load.arrived[file_type].is_set():
+            if self.stop_event.is_set():
+                raise ServiceStopped(
+                    f"Сервис остановлен до поступления файла {file_type}"
+                )
+            waited = time.monotonic() - load.first_seen
+            if waited >= self.file_timeout:
+                self.logger.warning(
+                    f"Файл {file_type} за дату {load.date_str} не поступил "
+                    f"за {self.file_timeout:g} с, продолжаю без него"
+                )
+                return 0
+            load.arrived[file_type].wait(
+                min(self.poll_interval, self.file_timeout - waited)
+            )
+
+        return self.pipeline._stage_file(
+            load.date_str, meta_type, load.files[file_type], handler,
+            load.date_str
+        )
+
+    def _wait_previous(self, load):
+        """Ожидание завершения всех более ранних дат"""
+        with self._lock:
+            previous = [
+                other for other in self._loads.values()
+                if other.day < load.day
+            ]
+        for other in previous:
+            while not other.done.wait(self.poll_interval):
+                if self.stop_event.is_set():
+                    raise ServiceStopped("Сервис остановлен")
+            if other.error is not None:
+                raise RuntimeError(
+                    f"Предыдущая дата {other.date_str} не загружена: "
+                    f"{str(other.error)}"
+                )
+        return len(previous)
@@ -0,0 +1,26 @@
+-- Хвост истории карт для расчета витрины в памяти процесса
+-- (тот же отбор, что в CTE stream шаблона build_fraud_report.sql)
+WITH new_day AS (
+    SELECT MIN(transaction_date) AS start_dt FROM bank.stg_transactions_{stg_suffix}
+)
+SELECT
+    h.trans_id AS transaction_id, h.trans_date AS transaction_date,
+    h.amt AS amount, h.card_num, h.oper_type, h.oper_result, h.terminal
+FROM (
+    SELECT tail.*
+    FROM (SELECT DISTINCT card_num FROM bank.stg_transactions_{stg_suffix}) k
+    CROSS JOIN LATERAL (
+        SELECT *
+        FROM bank.dwh_fact_transactions f
+        WHERE f.card_num = k.card_num
+          AND f.trans_date < (SELECT start_dt FROM new_day)
+        ORDER BY f.trans_date DESC
+        LIMIT {history_depth}
+    ) tail
+    UNION
+    SELECT f.*
+    FROM bank.dwh_fact_transactions f
+    WHERE f.trans_date >= (SELECT start_dt FROM new_day) - INTERVAL '{history_minutes} minutes'
+      AND f.trans_date < (SELECT start_dt FROM new_day)
+      AND f.card_num IN (SELECT card_num FROM bank.stg_transactions_{stg_suffix})
+) h
@@ -1,45 +1,52 @@
--- Загрузка измерений 
--- Загрузка терминалов (SCD2)
--- 1. Закрываем старые версии, если данные изменились
-UPDATE bank.dwh_dim_terminals_hist tgt
-SET effective_to = CAST(:date_str as DATE) - INTERVAL '1 day'
-FROM bank.stg_terminals_temp src
-WHERE tgt.terminal_id = src.terminal_id
-  AND tgt.effective_to = '9999-12-31'
-  AND tgt.deleted_flg <> 1
-  AND (
-      tgt.terminal_type <> src.terminal_type OR
-      tgt.terminal_city <> src.terminal_city OR
-      tgt.terminal_address <> src.terminal_address
-  );
-
--- 2. Обновляем список терминалов
-INSERT INTO bank.dwh_dim_terminals_hist (
-    terminal_id, terminal_type, terminal_city, terminal_address, 
-    effective_from
+-- Загрузка измерения SCD2 (шаблон, измерения описаны в py_scripts/dimensions.py)
+-- Версия строки сравнивается по хэшу отслеживаемых колонок: вставки,
+-- изменения и удаления определяются одним соединением снимка
+-- с текущими версиями и применяются одной командой
+WITH src AS (
+    -- снимок измерения за дату загрузки (дубли ключа отбрасываются)
+    SELECT DISTINCT ON ({keys}) {keys}, {columns},
+           md5(ROW({columns})::TEXT) AS row_hash
+    FROM bank.{source}_{stg_suffix}
+    ORDER BY {keys}
+), cur AS (
+    -- только текущие версии
+    SELECT {keys}, {columns}, effective_from, deleted_flg,
+           md5(ROW({columns})::TEXT) AS row_hash
+    FROM bank.{table}
+    WHERE effective_to = '9999-12-31'
+), diff AS (
+    SELECT
+        {diff_keys},
+        {diff_columns},
+        cur.effective_from AS cur_effective_from,
+        CASE WHEN src.row_hash IS NULL THEN 1 ELSE 0 END AS deleted_flg
+    FROM src
+    FULL JOIN cur ON {join_keys}
+    -- новая строка
+    WHERE cur.row_hash IS NULL
+       -- изменение или восстановление удаленной строки
+       OR (src.row_hash IS NOT NULL
+           AND (src.row_hash <> cur.row_hash OR cur.deleted_flg = 1))
+       -- удаление: строки нет в непустом снимке
+       OR (src.row_hash IS NULL AND cur.deleted_flg = 0
+           AND EXISTS (SELECT 1 FROM src))
+), closed AS (
+    -- закрываем текущие версии (версия, открытая в ту же дату
+    -- при повторной загрузке, перезаписывается ниже)
+    UPDATE bank.{table} tgt
+    SET effective_to = CAST(:date_str AS DATE) - 1
+    FROM diff
+    WHERE {close_keys}
+      AND tgt.effective_from = diff.cur_effective_from
+      AND tgt.effective_from < CAST(:date_str AS DATE)
 )
-SELECT
-    src.terminal_id, src.terminal_type, src.terminal_city, src.terminal_address,
-    :date_str
-FROM bank.stg_terminals_temp src
-JOIN bank.dwh_dim_terminals_hist tgt
-  ON src.terminal_id = tgt.terminal_id
-WHERE (
-      tgt.terminal_type <> src.terminal_type OR
-      tgt.terminal_city <> src.terminal_city OR
-      tgt.terminal_address <> src.terminal_address
-  ) AND tgt.deleted_flg <> 1
-ON CONFLICT (terminal_id, effective_from) DO NOTHING;
-
--- 3. Вставляем новые терминалы
-INSERT INTO bank.dwh_dim_terminals_hist (
-    terminal_id, terminal_type, terminal_city, terminal_address, effective_from
+INSERT INTO bank.{table} (
+    {keys}, {columns}, effective_from, effective_to, deleted_flg
 )
 SELECT
-    src.terminal_id, src.terminal_type, src.terminal_city, src.terminal_address,
-    :date_str
-FROM bank.stg_terminals_temp src
-LEFT JOIN bank.dwh_dim_terminals_hist tgt
-  ON src.terminal_id = tgt.terminal_id
-WHERE tgt.terminal_id IS NULL
-ON CONFLICT (terminal_id, effective_from) DO NOTHING;
+    {keys}, {columns}, CAST(:date_str AS DATE), '9999-12-31', deleted_flg
+FROM diff
+ON CONFLICT ({keys}, effective_from) DO UPDATE SET
+    {update_columns},
+    effective_to = EXCLUDED.effective_to,
+    deleted_flg = EXCLUDED.deleted_flg;
@@ -7,15 +7,15 @@ INSERT INTO bank.dwh_fact_transactions (
 )
 SELECT 
     transaction_id, 
-    transaction_date::TIMESTAMP, 
-    replace(amount, ',', '.')::DECIMAL(15,2),
+    transaction_date, 
+    amount,
     card_num, 
     oper_type, 
     oper_result, 
     terminal, 
     :date_str
-FROM bank.stg_transactions_temp
-ON CONFLICT (trans_id) DO NOTHING;
+FROM bank.stg_transactions_{stg_suffix}
+ON CONFLICT (trans_id, trans_date) DO NOTHING;
 
 -- Загрузка черного списка паспортов
 INSERT INTO bank.dwh_fact_passport_blacklist (
@@ -23,7 +23,7 @@ INSERT INTO bank.dwh_fact_passport_blacklist (
 )
 SELECT 
     passport, 
-    date::DATE, 
+    date, 
     :date_str
-FROM bank.stg_passport_blacklist_temp
+FROM bank.stg_passport_blacklist_{stg_suffix}
 ON CONFLICT (passport, entry_dt) DO NOTHING;
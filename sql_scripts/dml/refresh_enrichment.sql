@@ -0,0 +1,50 @@
+-- Обновление обогащения карт: пишутся только изменившиеся строки
+INSERT INTO bank.dwh_card_enrichment (
+    card_num, account, account_valid_to, client_id, passport_num,
+    fio, phone, passport_valid_to, date_of_birth
+)
+SELECT DISTINCT ON (card.card_num)
+    card.card_num,
+    acc.account,
+    acc.valid_to,
+    c.client_id,
+    c.passport_num,
+    CONCAT(c.last_name, ' ', c.first_name, ' ', c.patronymic),
+    c.phone,
+    c.passport_valid_to,
+    c.date_of_birth
+FROM bank.cards card
+JOIN bank.accounts acc ON card.account = acc.account
+JOIN bank.clients c ON acc.client = c.client_id
+ORDER BY card.card_num, acc.valid_to DESC
+ON CONFLICT (card_num) DO UPDATE SET
+    account = EXCLUDED.account,
+    account_valid_to = EXCLUDED.account_valid_to,
+    client_id = EXCLUDED.client_id,
+    passport_num = EXCLUDED.passport_num,
+    fio = EXCLUDED.fio,
+    phone = EXCLUDED.phone,
+    passport_valid_to = EXCLUDED.passport_valid_to,
+    date_of_birth = EXCLUDED.date_of_birth,
+    refreshed_at = CURRENT_TIMESTAMP
+WHERE (
+    bank.dwh_card_enrichment.account, bank.dwh_card_enrichment.account_valid_to,
+    bank.dwh_card_enrichment.client_id, bank.dwh_card_enrichment.passport_num,
+    bank.dwh_card_enrichment.fio, bank.dwh_card_enrichment.phone,
+    bank.dwh_card_enrichment.passport_valid_to, bank.dwh_card_enrichment.date_of_birth
+) IS DISTINCT FROM (
+    EXCLUDED.account, EXCLUDED.account_valid_to,
+    EXCLUDED.client_id, EXCLUDED.passport_num,
+    EXCLUDED.fio, EXCLUDED.phone,
+    EXCLUDED.passport_valid_to, EXCLUDED.date_of_birth
+);
+
+-- Удаление карт, которых больше нет в источнике
+DELETE FROM bank.dwh_card_enrichment e
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM bank.cards card
+    JOIN bank.accounts acc ON card.account = acc.account
+    JOIN bank.clients c ON acc.client = c.client_id
+    WHERE card.card_num = e.card_num
+);
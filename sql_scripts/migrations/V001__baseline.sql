@@ -64,9 +64,53 @@ CREATE TABLE IF NOT EXISTS bank.meta_last_update (
     last_update_type VARCHAR(50)
 );
 
+CREATE TABLE IF NOT EXISTS bank.meta_stage_metrics (
+    metric_id SERIAL PRIMARY KEY,
+    run_id VARCHAR(64),
+    load_date DATE,
+    stage_name VARCHAR(255),
+    statement_index INTEGER,
+    status VARCHAR(50),
+    duration_sec NUMERIC(12,3),
+    rows_processed BIGINT,
+    rows_per_sec NUMERIC(15,2),
+    peak_rss_mb NUMERIC(12,2),
+    started_at TIMESTAMP,
+    details VARCHAR(255),
+    metric_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Создание staging-таблиц (очищаются перед каждой загрузкой)
+CREATE TABLE IF NOT EXISTS bank.stg_transactions_temp (
+    transaction_id TEXT,
+    transaction_date TIMESTAMP,
+    amount DECIMAL(15,2),
+    card_num TEXT,
+    oper_type TEXT,
+    oper_result TEXT,
+    terminal TEXT
+);
+
+CREATE TABLE IF NOT EXISTS bank.stg_passport_blacklist_temp (
+    date DATE,
+    passport TEXT
+);
+
+CREATE TABLE IF NOT EXISTS bank.stg_terminals_temp (
+    terminal_id TEXT,
+    terminal_type TEXT,
+    terminal_city TEXT,
+    terminal_address TEXT
+);
+
 -- Создание индексов для оптимизации
 CREATE INDEX IF NOT EXISTS idx_transactions_card_num ON bank.dwh_fact_transactions(card_num);
 CREATE INDEX IF NOT EXISTS idx_transactions_date ON bank.dwh_fact_transactions(trans_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_card_date ON bank.dwh_fact_transactions(card_num, trans_date);
 CREATE INDEX IF NOT EXISTS idx_blacklist_passport ON bank.dwh_fact_passport_blacklist(passport);
 CREATE INDEX IF NOT EXISTS idx_fraud_event_dt ON bank.rep_fraud(event_dt);
 CREATE INDEX IF NOT EXISTS idx_fraud_passport ON bank.rep_fraud(passport);
+CREATE INDEX IF NOT EXISTS idx_stage_metrics_date ON bank.meta_stage_metrics(load_date, stage_name);
+CREATE INDEX IF NOT EXISTS idx_stg_transactions_card_date ON bank.stg_transactions_temp(card_num, transaction_date);
+CREATE INDEX IF NOT EXISTS idx_stg_transactions_date ON bank.stg_transactions_temp(transaction_date);
+CREATE INDEX IF NOT EXISTS idx_stg_transactions_terminal ON bank.stg_transactions_temp(terminal);
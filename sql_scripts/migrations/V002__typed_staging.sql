@@ -0,0 +1,23 @@
+-- Пересоздание staging-таблиц с типизированными колонками
+-- (в старых установках они создавались через DataFrame.to_sql как TEXT)
+DROP TABLE IF EXISTS bank.stg_transactions_temp;
+DROP TABLE IF EXISTS bank.stg_passport_blacklist_temp;
+
+CREATE TABLE bank.stg_transactions_temp (
+    transaction_id TEXT,
+    transaction_date TIMESTAMP,
+    amount DECIMAL(15,2),
+    card_num TEXT,
+    oper_type TEXT,
+    oper_result TEXT,
+    terminal TEXT
+);
+
+CREATE TABLE bank.stg_passport_blacklist_temp (
+    date DATE,
+    passport TEXT
+);
+
+CREATE INDEX idx_stg_transactions_card_date ON bank.stg_transactions_temp(card_num, transaction_date);
+CREATE INDEX idx_stg_transactions_date ON bank.stg_transactions_temp(transaction_date);
+CREATE INDEX idx_stg_transactions_terminal ON bank.stg_transactions_temp(terminal);
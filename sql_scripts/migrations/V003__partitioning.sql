@@ -0,0 +1,139 @@
+-- Секционирование фактов транзакций и витрины мошенничества по месяцам
+
+-- Создание секции за месяц, если ее еще нет: <таблица>_pYYYYMM
+CREATE OR REPLACE FUNCTION bank.ensure_month_partition(p_parent TEXT, p_month DATE)
+RETURNS VOID AS $$
+DECLARE
+    v_from DATE := date_trunc('month', p_month)::DATE;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS bank.%I PARTITION OF bank.%I FOR VALUES FROM (%L) TO (%L)',
+        p_parent || '_p' || to_char(v_from, 'YYYYMM'),
+        p_parent,
+        v_from,
+        (v_from + INTERVAL '1 month')::DATE
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Создание секций за все месяцы интервала
+CREATE OR REPLACE FUNCTION bank.ensure_partitions(p_parent TEXT, p_from DATE, p_to DATE)
+RETURNS VOID AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::DATE;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        PERFORM bank.ensure_month_partition(p_parent, v_month);
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединение секций, целиком лежащих раньше p_before; возвращает их имена
+CREATE OR REPLACE FUNCTION bank.detach_partitions_before(p_parent TEXT, p_before DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_part RECORD;
+BEGIN
+    FOR v_part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = 'bank'
+          AND p.relname = p_parent
+          AND c.relname ~ ('^' || p_parent || '_p[0-9]{6}$')
+          AND to_date(right(c.relname, 6), 'YYYYMM') + INTERVAL '1 month' <= p_before
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE bank.%I DETACH PARTITION bank.%I', p_parent, v_part.relname
+        );
+        RETURN NEXT v_part.relname;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Факты транзакций: ключ секционирования trans_date входит в первичный ключ.
+-- Уникальность одного trans_id база больше не гарантирует (в секционированной
+-- таблице ключ обязан содержать trans_date): транзакция с тем же trans_id,
+-- но другим trans_date, будет сохранена отдельной строкой.
+-- Строки без trans_date ни в одну секцию не попадают: миграция прерывается,
+-- чтобы они не были потеряны при замене таблицы
+DO $$
+DECLARE
+    v_missing BIGINT;
+BEGIN
+    SELECT count(*) INTO v_missing
+    FROM bank.dwh_fact_transactions
+    WHERE trans_date IS NULL;
+
+    IF v_missing > 0 THEN
+        RAISE EXCEPTION
+            'В bank.dwh_fact_transactions % строк без trans_date: '
+            'исправьте или удалите их до секционирования', v_missing;
+    END IF;
+END;
+$$;
+
+ALTER TABLE bank.dwh_fact_transactions RENAME TO dwh_fact_transactions_legacy;
+ALTER INDEX bank.dwh_fact_transactions_pkey RENAME TO dwh_fact_transactions_legacy_pkey;
+
+CREATE TABLE bank.dwh_fact_transactions (
+    trans_id VARCHAR(128),
+    trans_date TIMESTAMP,
+    amt DECIMAL(15,2),
+    card_num VARCHAR(128),
+    oper_type VARCHAR(50),
+    oper_result VARCHAR(50),
+    terminal VARCHAR(128),
+    create_dt DATE DEFAULT '1970-01-01',
+    update_dt DATE DEFAULT CURRENT_DATE,
+    PRIMARY KEY (trans_id, trans_date)
+) PARTITION BY RANGE (trans_date);
+
+SELECT bank.ensure_partitions(
+    'dwh_fact_transactions',
+    COALESCE(MIN(trans_date), CURRENT_DATE)::DATE,
+    COALESCE(MAX(trans_date), CURRENT_DATE)::DATE
+)
+FROM bank.dwh_fact_transactions_legacy;
+
+INSERT INTO bank.dwh_fact_transactions
+SELECT * FROM bank.dwh_fact_transactions_legacy;
+
+DROP TABLE bank.dwh_fact_transactions_legacy;
+
+CREATE INDEX idx_transactions_card_num ON bank.dwh_fact_transactions(card_num);
+CREATE INDEX idx_transactions_date ON bank.dwh_fact_transactions(trans_date);
+CREATE INDEX idx_transactions_card_date ON bank.dwh_fact_transactions(card_num, trans_date);
+
+-- Витрина мошенничества
+ALTER TABLE bank.rep_fraud RENAME TO rep_fraud_legacy;
+ALTER INDEX bank.rep_fraud_pkey RENAME TO rep_fraud_legacy_pkey;
+
+CREATE TABLE bank.rep_fraud (
+    event_dt TIMESTAMP,
+    passport VARCHAR(128),
+    fio VARCHAR(255),
+    phone VARCHAR(128),
+    event_type VARCHAR(255),
+    report_dt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_dt, passport, event_type)
+) PARTITION BY RANGE (event_dt);
+
+SELECT bank.ensure_partitions(
+    'rep_fraud',
+    COALESCE(MIN(event_dt), CURRENT_DATE)::DATE,
+    COALESCE(MAX(event_dt), CURRENT_DATE)::DATE
+)
+FROM bank.rep_fraud_legacy;
+
+INSERT INTO bank.rep_fraud
+SELECT * FROM bank.rep_fraud_legacy;
+
+DROP TABLE bank.rep_fraud_legacy;
+
+CREATE INDEX idx_fraud_event_dt ON bank.rep_fraud(event_dt);
+CREATE INDEX idx_fraud_passport ON bank.rep_fraud(passport);
@@ -0,0 +1,57 @@
+-- Денормализованное обогащение карты данными договора и клиента
+CREATE TABLE IF NOT EXISTS bank.dwh_card_enrichment (
+    card_num VARCHAR(128) PRIMARY KEY,
+    account VARCHAR(128),
+    account_valid_to DATE,
+    client_id VARCHAR(128),
+    passport_num VARCHAR(128),
+    fio VARCHAR(255),
+    phone VARCHAR(128),
+    passport_valid_to DATE,
+    date_of_birth DATE,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Версии таблиц-источников: version растет при каждом изменении,
+-- refreshed_version - версия, по которой последний раз обновлялось обогащение
+CREATE TABLE IF NOT EXISTS bank.meta_source_state (
+    table_name VARCHAR(128) PRIMARY KEY,
+    version BIGINT DEFAULT 0,
+    refreshed_version BIGINT DEFAULT -1
+);
+
+CREATE OR REPLACE FUNCTION bank.bump_source_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO bank.meta_source_state(table_name, version)
+    VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE
+        SET version = bank.meta_source_state.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Подключение отслеживания изменений к таблице-источнику
+CREATE OR REPLACE FUNCTION bank.track_source_table(p_table TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    IF to_regclass('bank.' || p_table) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_source_version ON bank.%I', p_table);
+    EXECUTE format(
+        'CREATE TRIGGER trg_source_version '
+        'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON bank.%I '
+        'FOR EACH STATEMENT EXECUTE FUNCTION bank.bump_source_version()',
+        p_table
+    );
+    INSERT INTO bank.meta_source_state(table_name)
+    VALUES (p_table)
+    ON CONFLICT (table_name) DO NOTHING;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT bank.track_source_table(t)
+FROM unnest(ARRAY['cards', 'accounts', 'clients']) AS t;
@@ -0,0 +1,23 @@
+-- Отпечатки успешно загруженных файлов: размер, время изменения и
+-- SHA-256 содержимого. По ним пропускаются повторно доставленные файлы
+-- и не изменившиеся снимки справочников
+CREATE TABLE IF NOT EXISTS bank.meta_file_fingerprint (
+    fingerprint_id SERIAL PRIMARY KEY,
+    load_date DATE NOT NULL,
+    file_type VARCHAR(50) NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_mtime TIMESTAMP NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Поиск уже загруженного содержимого
+CREATE INDEX IF NOT EXISTS idx_file_fingerprint_hash
+    ON bank.meta_file_fingerprint(file_type, content_hash);
+-- Последний снимок справочника до даты загрузки
+CREATE INDEX IF NOT EXISTS idx_file_fingerprint_date
+    ON bank.meta_file_fingerprint(file_type, load_date);
+-- Повторное использование хэша без чтения файла
+CREATE INDEX IF NOT EXISTS idx_file_fingerprint_stat
+    ON bank.meta_file_fingerprint(file_name, file_size, file_mtime);
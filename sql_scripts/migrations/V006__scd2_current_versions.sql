@@ -0,0 +1,4 @@
+-- Текущие версии измерений: загрузка SCD2 читает только их
+CREATE INDEX IF NOT EXISTS idx_terminals_hist_current
+    ON bank.dwh_dim_terminals_hist(terminal_id)
+    WHERE effective_to = '9999-12-31';
@@ -0,0 +1,12 @@
+-- Контрольные точки этапов загрузки даты: по ним запуск с --resume
+-- продолжает дату с первого незавершенного этапа. input_hash - хэш
+-- отпечатков файлов, из которых получен результат этапа
+CREATE TABLE IF NOT EXISTS bank.meta_stage_checkpoint (
+    load_date DATE NOT NULL,
+    stage_name VARCHAR(100) NOT NULL,
+    input_hash VARCHAR(64) NOT NULL,
+    stg_table VARCHAR(255),
+    rows_processed BIGINT,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (load_date, stage_name)
+);
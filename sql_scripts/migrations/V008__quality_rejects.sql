@@ -0,0 +1,7 @@
+-- Число строк, отклоненных проверкой качества данных перед staging
+-- (сами строки с причинами сохраняются в файл карантина)
+ALTER TABLE bank.meta_load_info
+    ADD COLUMN IF NOT EXISTS records_rejected INTEGER DEFAULT 0;
+
+ALTER TABLE bank.meta_stage_checkpoint
+    ADD COLUMN IF NOT EXISTS rows_rejected BIGINT DEFAULT 0;
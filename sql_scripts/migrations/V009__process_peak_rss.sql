@@ -0,0 +1,4 @@
+-- ru_maxrss - пик RSS за все время жизни процесса, а не за этап:
+-- колонка переименована, чтобы не читаться как потребление этапа
+ALTER TABLE bank.meta_stage_metrics
+    RENAME COLUMN peak_rss_mb TO process_peak_rss_mb;